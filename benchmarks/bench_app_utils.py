@@ -0,0 +1,290 @@
+"""Micro-benchmarks for the app_utils hot path on synthetic decks
+
+Run with:
+
+    uv run python benchmarks/bench_app_utils.py --sizes 10 10000 --tags 10 1000
+
+Pure stages (filters, scheduler, grading, typeahead) are called directly. The Streamlit
+stages (config_form, initialize_queue, show_progress, check_answer/update_queue and full
+reruns of app.py) run headless through streamlit.testing.v1.AppTest, against a .flipdeck
+file written for every synthetic deck. Every stage also reports the peak memory it
+allocates, measured with tracemalloc in a separate, untimed pass.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from flip_cards.deck import Deck, DeckBuilder  # noqa: E402
+from flip_cards.deck_format import write_deck  # noqa: E402
+from flip_cards.deck_store import SharedDeck  # noqa: E402
+from flip_cards.index import filter_question_indices  # noqa: E402
+from flip_cards.scheduler import INFINITE_PRACTICE_LENGTH, LeitnerPolicy, Scheduler  # noqa: E402
+
+APP_PATH = ROOT / "src" / "flip_cards" / "app.py"
+N_REPEATS = 50
+
+Results = Dict[str, Dict[str, float]]
+
+
+def make_deck(n_cards: int, n_tags: int, seed: int = 0) -> Deck:
+    rng = random.Random(seed)
+    tags = [f"tag{i}" for i in range(n_tags)]
+    builder = DeckBuilder()
+    for i in range(n_cards):
+        builder.add(
+            question=f"Welke vogel zingt als nummer {i}?",
+            answer=f"Vogel {i}",
+            tags=rng.sample(tags, k=min(n_tags, rng.randint(0, 3))),
+            info=f"Tuu tii {i}",
+        )
+    return builder.build()
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    samples_ms = sorted(s * 1000 for s in samples)
+    if len(samples_ms) > 1:
+        quantiles = statistics.quantiles(samples_ms, n=100, method="inclusive")
+        p50, p90, p99 = quantiles[49], quantiles[89], quantiles[98]
+    else:
+        p50 = p90 = p99 = samples_ms[0]
+    return {"n": len(samples_ms), "p50_ms": p50, "p90_ms": p90, "p99_ms": p99}
+
+
+def time_calls(func: Callable[[], object], n: int = N_REPEATS) -> List[float]:
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def peak_mb(func: Callable[[], object]) -> float:
+    """Peak memory allocated while calling func, in MB"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stage(
+    results: Results, name: str, func: Callable[[], object], n: int = N_REPEATS
+) -> Results:
+    results[name] = summarize(time_calls(func, n))
+    results[name]["peak_mb"] = peak_mb(func)
+    return results
+
+
+def bench_pure(deck: Deck, n_tags: int) -> Results:
+    results: Results = {}
+
+    start = time.perf_counter()
+    shared_deck = SharedDeck("bench", 1, deck, deck.answers)
+    results["shared_deck"] = summarize([time.perf_counter() - start])
+    results["shared_deck"]["peak_mb"] = peak_mb(lambda: SharedDeck("bench", 1, deck, deck.answers))
+
+    rng = random.Random(1)
+    tags = [f"tag{i}" for i in range(n_tags)]
+
+    def _filter():
+        # Cleared, to time the filters themselves instead of the cache
+        shared_deck.index.filter_cache.clear()
+        filter_question_indices(
+            shared_deck.index,
+            frozenset(),
+            frozenset(rng.sample(tags, k=min(2, n_tags))),
+            frozenset(rng.sample(tags, k=min(1, n_tags))),
+        )
+
+    bench_stage(results, "filter", _filter)
+    bench_stage(
+        results,
+        "filter_cached",
+        lambda: filter_question_indices(shared_deck.index, frozenset(), frozenset(), frozenset()),
+    )
+
+    scheduler = Scheduler(
+        range(len(deck)), LeitnerPolicy(), length=INFINITE_PRACTICE_LENGTH, seed=1
+    )
+
+    def _answer():
+        scheduler.reschedule(scheduler.current, rng.random() < 0.7)
+        scheduler.advance()
+
+    bench_stage(results, "scheduler", _answer, n=N_REPEATS * 20)
+
+    matcher = shared_deck.matcher
+    question_indices = [rng.randrange(len(deck)) for _ in range(N_REPEATS)]
+    results["grade_typo"] = summarize(
+        [
+            sample
+            for i in question_indices
+            for sample in time_calls(lambda: matcher.is_correct(deck.answer(i)[:-1], i, 1), n=1)
+        ]
+    )
+    results["grade_typo"]["peak_mb"] = peak_mb(
+        lambda: [matcher.is_correct(deck.answer(i)[:-1], i, 1) for i in question_indices]
+    )
+
+    # Two edits, so the answers of the other cards are searched for a closer one
+    results["grade_typo_2"] = summarize(
+        [
+            sample
+            for i in question_indices
+            for sample in time_calls(
+                lambda: matcher.is_correct(deck.answer(i)[:-2] + "xy", i, 2), n=1
+            )
+        ]
+    )
+    results["grade_typo_2"]["peak_mb"] = peak_mb(
+        lambda: [matcher.is_correct(deck.answer(i)[:-2] + "xy", i, 2) for i in question_indices]
+    )
+
+    typeahead = shared_deck.typeahead
+    bench_stage(results, "typeahead", lambda: typeahead.complete("vogel 12"))
+    selection = typeahead.restrict(range(0, len(deck), 2))
+    bench_stage(results, "typeahead_selection", lambda: selection.complete("vogel 12"))
+    return results
+
+
+def _stages_script():
+    # Runs inside AppTest, so everything it needs is imported here
+    import time
+    import tracemalloc
+
+    import streamlit as st
+
+    from flip_cards import app_utils
+
+    # The first run only measures memory, tracing allocations would slow down the timings
+    trace_memory = "bench_timings" not in st.session_state
+    timings = st.session_state.setdefault("bench_timings", {})
+    peak_memory = st.session_state.setdefault("bench_peak_memory", {})
+
+    def timed(name, func):
+        if trace_memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            peak_memory[name] = max(peak_memory.get(name, 0), peak)
+            return
+        start = time.perf_counter()
+        func()
+        timings.setdefault(name, []).append(time.perf_counter() - start)
+
+    deck = app_utils.load_deck()
+    if not st.session_state.get("initialized"):
+        app_utils.initialize_session_state(deck)
+
+    timed("config_form", app_utils.config_form)
+
+    st.session_state["config"] = st.session_state["_config"].copy()
+    st.session_state["config"]["random_selection"] = False
+    st.session_state["config"]["question_start_index"] = 0
+    st.session_state["config"]["question_end_index"] = len(deck)
+    # Small decks would run out of questions before the last answer otherwise
+    st.session_state["config"]["infinite_practice"] = True
+    timed("initialize_queue", app_utils.initialize_queue)
+    app_utils.define_answer_suggestions()
+    app_utils.reset_session_state()
+
+    for i in range(50):
+        if st.session_state["quiz"].finished:
+            break
+        app_utils.get_current_question_answer_pair()
+        timed("show_progress", app_utils.show_progress)
+        st.session_state["given_answer"] = st.session_state["correct_answer"][: 1 + i % 10]
+        timed("check_answer", app_utils.check_answer)
+        timed("update_queue", app_utils.update_queue)
+        st.session_state["quiz"].advance()
+
+
+def bench_app(deck_path: Path) -> Results:
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["DECK_PATH"] = str(deck_path)
+    os.environ["ENV"] = "local"
+    st.cache_resource.clear()
+
+    results: Results = {}
+    stages = AppTest.from_function(_stages_script, default_timeout=600)
+    for _ in range(4):
+        stages.run()
+        if stages.exception:
+            raise RuntimeError(f"Stages failed: {stages.exception[0].message}")
+    for name, samples in stages.session_state["bench_timings"].items():
+        results[name] = summarize(samples)
+        results[name]["peak_mb"] = stages.session_state["bench_peak_memory"][name] / 2**20
+
+    app = AppTest.from_file(str(APP_PATH), default_timeout=600)
+    results["app_cold_run"] = summarize(time_calls(app.run, n=1))
+    app.sidebar.button[-1].click()
+    results["app_start_overhoring"] = summarize(time_calls(app.run, n=1))
+
+    rerun_samples = []
+    for i in range(N_REPEATS // 2):
+        answer_fields = [field for field in app.text_input if field.key == "answer_field"]
+        # After Check the field shows the graded answer and is disabled until Volgende
+        if answer_fields and not answer_fields[0].disabled:
+            answer_fields[0].input(f"vogel {i}")
+        start = time.perf_counter()
+        app.main.button[-1].click().run()  # Check, then Volgende
+        rerun_samples.append(time.perf_counter() - start)
+    results["app_rerun"] = summarize(rerun_samples)
+    return results
+
+
+def print_results(title: str, results: Results):
+    print(f"\n{title}")
+    for name, summary in results.items():
+        extra = f"  peak {summary['peak_mb']:.3f} MB" if "peak_mb" in summary else ""
+        print(
+            f"  {name:<22} p50 {summary['p50_ms']:9.3f} ms  p90 {summary['p90_ms']:9.3f} ms"
+            f"  p99 {summary['p99_ms']:9.3f} ms  (n={summary['n']}){extra}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--tags", type=int, nargs="+", default=[10, 1000])
+    parser.add_argument("--no-app", action="store_true", help="Skip the Streamlit benchmarks")
+    parser.add_argument("--json", help="Also write all results to this JSON file")
+    args = parser.parse_args()
+
+    all_results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_cards in args.sizes:
+            for n_tags in args.tags:
+                title = f"{n_cards} cards, {n_tags} tags"
+                deck = make_deck(n_cards, n_tags)
+                results = bench_pure(deck, n_tags)
+                if not args.no_app:
+                    deck_path = Path(tmp_dir) / f"bench_{n_cards}_{n_tags}.flipdeck"
+                    write_deck(deck, deck_path)
+                    results.update(bench_app(deck_path))
+                print_results(title, results)
+                all_results[title] = results
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(all_results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
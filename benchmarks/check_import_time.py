@@ -0,0 +1,153 @@
+"""Fails when importing the app or the CLI gets slower than its budget
+
+Run with:
+
+    uv run python benchmarks/check_import_time.py
+
+The tests run the same check, see tests/test_import_time.py. Every module is imported in a
+fresh interpreter, a few times, and the run that took the least CPU time is compared with the
+budget. Budgets are in milliseconds on top of an interpreter that imports the baseline
+modules, which every budgeted path imports as well. CPU time is not inflated by other
+processes on a busy machine the way wall-clock time is, and the baseline takes out most of the
+speed of the machine, so the budgets are fixed. Modules that should never be imported on a
+path, like Streamlit for the CLI, fail the check regardless of time. Unix only.
+"""
+
+import argparse
+import compileall
+import math
+import os
+import resource
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+N_RUNS = 7
+# Standard library modules that every budgeted path imports
+BASELINE_MODULES = ("argparse", "typing")
+
+_NO_DATA_LIBRARIES = ("streamlit", "pandas", "numpy", "pyarrow")
+
+
+class Budget(NamedTuple):
+    module: str
+    max_ms: float  # On top of the baseline
+    forbidden: Tuple[str, ...] = ()
+
+
+class DependencyMissing(Exception):
+    """A dependency of the module, like Streamlit, is not installed; that is not a regression"""
+
+
+BUDGETS = [
+    Budget("flip_cards.cli", 10, forbidden=_NO_DATA_LIBRARIES),
+    # The classes on the engine and drill paths are slotted classes instead of dataclasses,
+    # importing dataclasses alone would double the import time of the CLI
+    Budget("flip_cards.engine", 25, forbidden=(*_NO_DATA_LIBRARIES, "dataclasses")),
+    Budget("flip_cards.drill", 25, forbidden=(*_NO_DATA_LIBRARIES, "sqlite3", "dataclasses")),
+    Budget("flip_cards.app_utils", 1000, forbidden=("pandas", "pyarrow", "sqlite3", "dotenv")),
+]
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative import time in microseconds per module"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def _importtime(modules: str) -> Tuple[float, Dict[str, int]]:
+    """CPU time in milliseconds of an interpreter that imports the modules, and its imports"""
+    env = {**os.environ, "PYTHONPATH": str(ROOT / "src")}
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modules}"],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_seconds = after.ru_utime - before.ru_utime + after.ru_stime - before.ru_stime
+    return cpu_seconds * 1000, parse_importtime(result.stderr)
+
+
+def measure(module: str, n_runs: int) -> Tuple[float, List[str]]:
+    """CPU time of importing the module on top of the baseline in milliseconds, and all
+    modules it imported
+
+    Runs of the module and the baseline take turns, so both see the same load of the machine.
+    """
+    baseline_runs = []
+    runs = []
+    for _ in range(n_runs):
+        baseline_runs.append(_importtime(", ".join(BASELINE_MODULES))[0])
+        cpu_ms, cumulative = _importtime(module)
+        runs.append(cpu_ms)
+    return min(runs) - min(baseline_runs), list(cumulative)
+
+
+def compile_sources():
+    # So the source is not compiled on every import when PYTHONDONTWRITEBYTECODE is set, which
+    # an installed package never does
+    compileall.compile_dir(str(ROOT / "src"), quiet=1)
+
+
+def check_budget(
+    budget: Budget, n_runs: int = N_RUNS, scale: float = 1.0
+) -> Tuple[float, float, List[str]]:
+    """Import time on top of the baseline, the budget and the failures of one module"""
+    max_ms = budget.max_ms * scale
+    try:
+        ms, imported = measure(budget.module, n_runs)
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.splitlines()[-1]
+        if error.startswith("ModuleNotFoundError") and "flip_cards" not in error:
+            raise DependencyMissing(error)
+        return math.nan, max_ms, [f"{budget.module} cannot be imported: {error}"]
+    failures = []
+    if ms > max_ms:
+        failures.append(
+            f"{budget.module} takes {ms:.1f} ms to import on top of the baseline,"
+            f" over {max_ms:.0f} ms"
+        )
+    forbidden = sorted(name for name in budget.forbidden if name in imported)
+    if forbidden:
+        failures.append(f"{budget.module} imports {', '.join(forbidden)}")
+    return ms, max_ms, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=N_RUNS)
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiply all budgets, e.g. on slow CI machines"
+    )
+    args = parser.parse_args()
+
+    compile_sources()
+
+    all_failures = []
+    for budget in BUDGETS:
+        try:
+            ms, max_ms, failures = check_budget(budget, args.runs, args.scale)
+        except DependencyMissing as e:
+            print(f"  {budget.module:<22} skipped, {e}")
+            continue
+        status = "FAIL" if failures else "ok"
+        print(f"  {budget.module:<22} {ms:+8.1f} ms (budget {max_ms:.0f} ms)  {status}")
+        all_failures.extend(failures)
+
+    for failure in all_failures:
+        print(failure, file=sys.stderr)
+    sys.exit(1 if all_failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Answers of all sessions, aggregated per card to see which cards are difficult
+
+Answers are appended to a queue without taking a lock. A background thread adds them to
+NumPy counters per deck version every flush_interval seconds, and adds the counters to the
+totals per card in SQLite. Cards are stored by question and answer, so their totals carry
+over to new versions of the deck.
+"""
+
+import logging
+import sqlite3
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from flip_cards.deck_store import SharedDeck
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 10.0  # Seconds
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS card_answers (
+    deck_id TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    n_timed INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (deck_id, question, answer)
+);
+"""
+
+_UPSERT = """
+INSERT INTO card_answers VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (deck_id, question, answer) DO UPDATE SET
+    attempts = attempts + excluded.attempts,
+    correct = correct + excluded.correct,
+    n_timed = n_timed + excluded.n_timed,
+    seconds = seconds + excluded.seconds
+"""
+
+
+class AnswerEvent(NamedTuple):
+    deck: SharedDeck
+    question_index: int
+    correct: bool
+    seconds: float  # From showing the question to checking the answer, NaN when unknown
+
+
+class CardCounters:
+    """Answer counters of every card of one deck version, as NumPy arrays"""
+
+    def __init__(self, n_cards: int):
+        self.attempts = np.zeros(n_cards, dtype=np.int64)
+        self.correct = np.zeros(n_cards, dtype=np.int64)
+        self.n_timed = np.zeros(n_cards, dtype=np.int64)  # Answers with a known time
+        self.seconds = np.zeros(n_cards, dtype=np.float64)
+
+    def add(self, question_indices: np.ndarray, correct: np.ndarray, seconds: np.ndarray):
+        n = len(self.attempts)
+        timed = ~np.isnan(seconds)
+        self.attempts += np.bincount(question_indices, minlength=n)
+        self.correct += np.bincount(question_indices, weights=correct, minlength=n).astype(np.int64)
+        self.n_timed += np.bincount(question_indices[timed], minlength=n)
+        self.seconds += np.bincount(question_indices[timed], weights=seconds[timed], minlength=n)
+
+    @property
+    def error_rate(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return 1 - self.correct / self.attempts
+
+    @property
+    def mean_seconds(self) -> np.ndarray:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.seconds / self.n_timed
+
+
+class TagCounters(NamedTuple):
+    tags: Tuple[str, ...]
+    counters: CardCounters  # One "card" per tag, summed over the cards with that tag
+
+
+def tag_counters(deck: SharedDeck, card_counters: CardCounters) -> TagCounters:
+    tag_indices = deck.deck.tag_indices()
+    counters = CardCounters(len(tag_indices))
+    for code, indices in enumerate(tag_indices):
+        counters.attempts[code] = card_counters.attempts[indices].sum()
+        counters.correct[code] = card_counters.correct[indices].sum()
+        counters.n_timed[code] = card_counters.n_timed[indices].sum()
+        counters.seconds[code] = card_counters.seconds[indices].sum()
+    return TagCounters(deck.deck.tag_vocabulary, counters)
+
+
+class Analytics:
+    """Aggregates answers of all sessions in the process, see the module docstring
+
+    Without a path, the totals are kept in an in-memory database and lost on a restart.
+    """
+
+    def __init__(self, path: Union[str, Path] = ":memory:", flush_interval: float = FLUSH_INTERVAL):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        # Appending to a deque is atomic, so sessions never wait for each other or the flush
+        self._events: Deque[AnswerEvent] = deque()
+        self._pending: Dict[Tuple[str, int], Tuple[SharedDeck, CardCounters]] = {}
+        self.n_events = 0
+        self.n_flushes = 0
+        self._lock = threading.Lock()  # For the counters and the connection, not for record()
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="analytics-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    def record(self, deck: SharedDeck, question_index: int, correct: bool, seconds: float):
+        self._events.append(AnswerEvent(deck, question_index, correct, seconds))
+
+    def _aggregate(self):
+        # Called with the lock held
+        events: Dict[Tuple[str, int], List[AnswerEvent]] = {}
+        while self._events:
+            event = self._events.popleft()
+            events.setdefault((event.deck.deck_id, event.deck.version), []).append(event)
+        for key, deck_events in events.items():
+            deck = deck_events[0].deck
+            if key not in self._pending:
+                self._pending[key] = (deck, CardCounters(len(deck)))
+            _, question_indices, correct, seconds = zip(*deck_events)
+            self._pending[key][1].add(
+                np.array(question_indices, dtype=np.intp),
+                np.array(correct, dtype=np.float64),
+                np.array(seconds, dtype=np.float64),
+            )
+            self.n_events += len(deck_events)
+
+    def _write(self):
+        # Called with the lock held. Only cards that were answered since the previous flush
+        rows = []
+        for deck, counters in self._pending.values():
+            for i in np.flatnonzero(counters.attempts).tolist():
+                rows.append(
+                    (
+                        deck.deck_id,
+                        deck.deck.question(i),
+                        deck.deck.answer(i),
+                        int(counters.attempts[i]),
+                        int(counters.correct[i]),
+                        int(counters.n_timed[i]),
+                        float(counters.seconds[i]),
+                    )
+                )
+        with self._connection:
+            self._connection.executemany(_UPSERT, rows)
+        self._pending.clear()
+        self.n_flushes += 1
+
+    def flush(self):
+        with self._lock:
+            self._aggregate()
+            if self._pending:
+                self._write()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error:
+                logger.exception("Failed to write answer analytics")
+
+    def close(self):
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        self._connection.close()
+
+    def card_counters(self, deck: SharedDeck) -> CardCounters:
+        """Totals per card of the deck, including answers given to earlier versions of it"""
+        self.flush()
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT question, answer, attempts, correct, n_timed, seconds FROM card_answers"
+                " WHERE deck_id = ?",
+                (deck.deck_id,),
+            ).fetchall()
+        counters = CardCounters(len(deck))
+        card_index = deck.card_index
+        for question, answer, attempts, correct, n_timed, seconds in rows:
+            i = card_index.get((question, answer))
+            if i is None:
+                continue  # Removed from the deck
+            counters.attempts[i] = attempts
+            counters.correct[i] = correct
+            counters.n_timed[i] = n_timed
+            counters.seconds[i] = seconds
+        return counters
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": len(self._events), "events": self.n_events, "flushes": self.n_flushes}
@@ -1,9 +1,6 @@
-import dotenv
 import streamlit as st
 
-from flip_cards import app_utils
-
-dotenv.load_dotenv()
+from flip_cards import app_utils, instrumentation
 
 st.set_page_config(
     page_title="Vogeltjes",
@@ -11,45 +8,68 @@ st.set_page_config(
     initial_sidebar_state=st.session_state.get("sidebar_state", "expanded"),
 )
 
-app_utils.you_shall_not_password()
+app_utils.load_env()
+
+# Size of the state left behind by the previous run
+instrumentation.record_session_state_size(st.session_state, app_utils.SHARED_STATE_KEYS)
 
-data = app_utils.load_data()
-question_objects, correct_answers = app_utils.prepare_question_answer_pairs(data)
+with instrumentation.stage("password"):
+    app_utils.you_shall_not_password()
+
+with instrumentation.stage("load_deck"):
+    deck = app_utils.load_deck(app_utils.deck_picker())
 
 if not st.session_state.get("initialized"):
-    app_utils.initialize_session_state(question_objects, correct_answers)
+    with instrumentation.stage("initialize_session_state"):
+        app_utils.initialize_session_state(deck)
+else:
+    app_utils.sync_deck_version()
 
-app_utils.config_form()
+with instrumentation.stage("config_form"):
+    app_utils.config_form()
 
 if not st.session_state.get("overhoring_started"):
     app_utils.welcome_message()
 
 if st.session_state["initialize_queue"]:
-    app_utils.initialize_queue()
-    app_utils.define_answer_suggestions()
-    app_utils.reset_session_state()
-    app_utils.clear_answer_field()
+    with instrumentation.stage("initialize_queue"):
+        app_utils.initialize_queue()
+        app_utils.define_answer_suggestions()
+        app_utils.reset_session_state()
+        app_utils.clear_answer_field()
+
+
+# Check and Volgende only rerun the quiz below, not the sidebar and the filters above
+@st.fragment
+def quiz_loop():
+    # Fragment reruns skip the top of the script, so a reloaded deck is picked up here as well
+    app_utils.sync_deck_version()
+
+    with instrumentation.stage("show_progress"):
+        app_utils.show_progress()
+
+    if st.session_state["quiz"].finished:
+        app_utils.stop_overhoring()
 
-app_utils.show_progress()
+    app_utils.get_current_question_answer_pair()
 
-if not st.session_state["queue"]:
-    app_utils.stop_overhoring()
+    if st.session_state["clear_answer_field"]:
+        app_utils.clear_answer_field()
 
-app_utils.get_current_question_answer_pair()
+    with instrumentation.stage("present_question"):
+        app_utils.present_question()
 
-if st.session_state["clear_answer_field"]:
-    app_utils.clear_answer_field()
+    with instrumentation.stage("answer_form"):
+        app_utils.answer_form("Antwoord:")
 
-app_utils.present_question()
+    if st.session_state["answer_submitted"]:
+        # app_utils.show_feedback_message()
+        with instrumentation.stage("present_question_information"):
+            app_utils.present_question_information()
 
-app_utils.answer_form("Antwoord:")
+    # Keep at the end of the quiz
+    with instrumentation.stage("focus"):
+        app_utils.focus_in_form("Antwoord:")
 
-if st.session_state["answer_submitted"]:
-    # app_utils.show_feedback_message()
-    app_utils.present_question_information()
 
-# Keep at the end of the script
-if st.session_state["focus_on_input"]:
-    app_utils.focus_on_input_in_form()
-elif st.session_state["focus_on_next_button"]:
-    app_utils.focus_on_next_button_in_form()
+quiz_loop()
@@ -1,48 +1,146 @@
+import math
 import os
 import random
 import time
-from typing import Dict, List, Tuple, Union
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, FrozenSet, List, Optional, Tuple, Union
 
-import pandas as pd
 import streamlit as st
 import streamlit.components.v1 as components
 
+from flip_cards import deck_format, engine, instrumentation, loaders
+from flip_cards.auth import Authenticator
 from flip_cards.config import Config
+from flip_cards.deck import Deck
+from flip_cards.deck_store import DEFAULT_DECK_ID, DeckStore, SharedDeck, file_stat
+from flip_cards.engine import QuizError, QuizSession
+from flip_cards.index import filter_question_bits, filter_question_indices
+from flip_cards.prefetch import N_PREFETCH, N_WORKERS, Prefetcher
 
-QuestionObjectType = Union[Dict, pd.Series]
+if TYPE_CHECKING:
+    # Only imported when needed, they add to the cold start of every worker
+    import pandas as pd
+
+    from flip_cards.analytics import Analytics
+    from flip_cards.media_cache import MediaCache
+    from flip_cards.progress_store import ProgressStore
+
+QuestionObjectType = Union[Dict, "pd.Series"]
+
+# Session state that refers to data shared by all sessions, see record_session_state_size()
+SHARED_STATE_KEYS = ("suggestions",)
+
+_typeahead_component = components.declare_component(
+    "typeahead", path=str(Path(__file__).parent / "components" / "typeahead")
+)
+_focus_component = components.declare_component(
+    "focus", path=str(Path(__file__).parent / "components" / "focus")
+)
+_cookie_component = components.declare_component(
+    "cookie", path=str(Path(__file__).parent / "components" / "cookie")
+)
+
+AUTH_COOKIE = "flip_cards_auth"
+
+
+@st.cache_resource(show_spinner=False)
+def load_env():
+    # Once per process instead of on every rerun
+    import dotenv
+
+    dotenv.load_dotenv()
+
+
+@st.cache_resource
+def get_authenticator() -> Authenticator:
+    secret = os.getenv("APP_SECRET")
+    return Authenticator(os.environ["APP_PASSWORD"], secret.encode() if secret else None)
+
+
+def _get_client_id() -> str:
+    # Behind a proxy every client shares the proxy address, so use the forwarded one. Only the
+    # addresses appended by our own proxies can be trusted, clients can send any header.
+    trusted_proxies = int(os.getenv("TRUSTED_PROXIES", "0"))
+    forwarded_for = st.context.headers.get("X-Forwarded-For")
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",")]
+        return hops[-min(trusted_proxies, len(hops))]
+    return st.context.ip_address or "unknown"
 
 
 def you_shall_not_password():
-    if (
-        os.getenv("APP_PASSWORD")
-        and not st.session_state.get("password_correct")
-        and not os.getenv("ENV") == "local"
-    ):
-        with st.form("password_form"):
-            entered_password = st.text_input("🦤 Wachtwoord:", type="password")
-            check_password = st.form_submit_button("Check")
-        if check_password:
-            if entered_password == os.environ["APP_PASSWORD"]:
-                st.session_state["password_correct"] = True
-                st.success("✅ Welkom!")
-                time.sleep(2)
-                st.rerun()
-            else:
-                time.sleep(3)
-                st.error("✋ You shall not pass!")
-                time.sleep(2)
-        st.stop()
+    if not os.getenv("APP_PASSWORD") or os.getenv("ENV") == "local":
+        return
+    authenticator = get_authenticator()
+    # The cookie keeps the login across browser refreshes, and with APP_SECRET across restarts
+    token = st.session_state.get("auth_token") or st.context.cookies.get(AUTH_COOKIE)
+    if authenticator.verify_token(token):
+        st.session_state["auth_token"] = token
+        _cookie_component(
+            name=AUTH_COOKIE,
+            value=token,
+            max_age=int(authenticator.token_ttl),
+            key="auth_cookie",
+            default=None,
+        )
+        return
+
+    with st.form("password_form"):
+        entered_password = st.text_input("🦤 Wachtwoord:", type="password")
+        check_password = st.form_submit_button("Check")
+    if check_password:
+        result = authenticator.check_password(_get_client_id(), entered_password)
+        if result.ok:
+            st.session_state["auth_token"] = authenticator.issue_token()
+            st.rerun()
+        elif result.rate_limited:
+            st.error(
+                f"✋ Te veel pogingen, probeer het over {math.ceil(result.retry_after)} seconden"
+                " opnieuw"
+            )
+        else:
+            st.error("✋ You shall not pass!")
+    st.stop()
 
 
-@st.cache_data
-def load_data() -> Union[Dict, pd.DataFrame]:
+@st.cache_data(ttl=60, show_spinner=False)
+def get_deck_paths() -> Dict[str, Optional[str]]:
+    """Deck id -> deck file, for the default deck and for every deck file in DECKS_DIR"""
+    deck_paths = {DEFAULT_DECK_ID: os.getenv("DECK_PATH")}
+    decks_dir = os.getenv("DECKS_DIR")
+    if decks_dir:
+        suffixes = {deck_format.SUFFIX, *loaders.supported_suffixes()}
+        for path in sorted(Path(decks_dir).iterdir()):
+            if path.suffix.lower() not in suffixes:
+                continue
+            # A compiled deck is used instead of its source
+            if path.stem not in deck_paths or path.suffix == deck_format.SUFFIX:
+                deck_paths[path.stem] = str(path)
+    return deck_paths
+
+
+def load_data(deck_id: str = DEFAULT_DECK_ID) -> Union[Dict, "pd.DataFrame", Deck]:
     # To be customized per use case
+    deck_path = get_deck_paths().get(deck_id)
+    if deck_path and deck_path.endswith(deck_format.SUFFIX):
+        return deck_format.open_deck(deck_path)
+    if deck_path:
+        deck, stats = loaders.load_deck(deck_path)
+        instrumentation.set_gauge("deck_load_rows", stats.rows)
+        instrumentation.set_gauge("deck_load_rows_per_second", stats.rows_per_second)
+        if stats.peak_memory_bytes is not None:
+            instrumentation.set_gauge("deck_load_peak_memory_bytes", stats.peak_memory_bytes)
+        return deck
     return {}
 
 
-@st.cache_data
 def prepare_question_answer_pairs(*args, **kwargs) -> Tuple[List[QuestionObjectType], List[str]]:
     # To be customized per use case
+    if args and isinstance(args[0], Deck):
+        return args[0], args[0].answers
+
     question_objects: List[QuestionObjectType] = [
         {
             "question": "Welke vogel zingt als de Merel?",
@@ -112,22 +210,261 @@ def prepare_question_answer_pairs(*args, **kwargs) -> Tuple[List[QuestionObjectT
     return question_objects, correct_answers
 
 
+@st.cache_resource
+def get_deck_store() -> DeckStore:
+    max_mb = os.getenv("DECK_CACHE_MB")
+    ttl = os.getenv("DECK_CACHE_TTL")
+    deck_store = DeckStore(
+        max_bytes=int(max_mb) * 2**20 if max_mb else None,
+        ttl=float(ttl) if ttl else None,
+    )
+    instrumentation.register_gauges("filter_cache", lambda: _filter_cache_info(deck_store))
+    instrumentation.register_gauges("deck_store", deck_store.stats.dict)
+    reload_interval = os.getenv("DECK_RELOAD_INTERVAL")
+    if reload_interval:
+        from flip_cards.hot_reload import DeckWatcher
+
+        DeckWatcher(deck_store, get_deck_paths, float(reload_interval)).start()
+    return deck_store
+
+
+def _filter_cache_info(deck_store: DeckStore) -> Dict[str, float]:
+    # Every deck has its own filter cache, summed over the loaded decks
+    filter_caches = [deck.index.filter_cache for deck in deck_store.loaded()]
+    return {
+        "hits": sum(cache.hits for cache in filter_caches),
+        "misses": sum(cache.misses for cache in filter_caches),
+        "size": sum(len(cache) for cache in filter_caches),
+    }
+
+
+def load_deck(deck_id: str = DEFAULT_DECK_ID) -> SharedDeck:
+    # Loaded once per process and shared read-only between all sessions
+    def _load():
+        with instrumentation.stage("load_data"):
+            data = load_data(deck_id)
+        with instrumentation.stage("prepare_question_answer_pairs"):
+            return prepare_question_answer_pairs(data)
+
+    def _stat():
+        # Before loading, so the deck watcher sees changes made while the deck loads
+        return file_stat(get_deck_paths().get(deck_id))
+
+    return get_deck_store().get_or_load(deck_id, _load, _stat)
+
+
+def _get_deck() -> SharedDeck:
+    # Loaded again when it was evicted since the previous rerun
+    return load_deck(st.session_state["deck_id"])
+
+
+def _drop_missing_selections(config: Dict, deck: SharedDeck):
+    answers = set(deck.correct_answers)
+    config["selected_questions"] = [a for a in config["selected_questions"] if a in answers]
+    for key in ("included_tags", "excluded_tags"):
+        config[key] = [tag for tag in config[key] if tag in deck.all_tags]
+
+
+def sync_deck_version():
+    """Moves the session to the latest version of its deck, after it was reloaded"""
+    if not st.session_state.get("initialized"):
+        return
+    deck = _get_deck()
+    quiz = st.session_state.get("quiz")
+    # A quiz of another deck is replaced when the next overhoring starts
+    stale_quiz = quiz is not None and quiz.deck.deck_id == deck.deck_id and quiz.deck is not deck
+    if deck.version == st.session_state["deck_version"] and not stale_quiz:
+        return
+    st.session_state["deck_version"] = deck.version
+    st.session_state["total_questions"] = len(deck)
+    for config in ("_config_default", "_config"):
+        _drop_missing_selections(st.session_state[config], deck)
+    # The widgets of the config form may hold cards or tags that no longer exist
+    for key in [key for key in st.session_state if str(key).endswith("_widget")]:
+        del st.session_state[key]
+
+    if not stale_quiz:
+        return
+    shown = None
+    if not quiz.finished:
+        shown = (quiz.deck.deck.question(quiz.current), quiz.deck.deck.answer(quiz.current))
+    quiz.remap(deck)
+    if not st.session_state.get("overhoring_started"):
+        return
+    if quiz.finished or quiz.current != deck.card_index.get(shown):
+        # The card that was shown was removed, continue with the next one
+        st.session_state["answer_submitted"] = False
+        st.session_state["answer_checked"] = False
+        st.session_state["clear_answer_field"] = True
+        _toggle_input_focus("input_field")
+    define_answer_suggestions()
+    prefetch_upcoming()
+    # The answers given so far can not be replayed on the new deck
+    _save_progress()
+
+
+def deck_picker() -> str:
+    deck_ids = list(get_deck_paths())
+    deck_id = st.session_state.get("deck_id", DEFAULT_DECK_ID)
+    if len(deck_ids) == 1:
+        return deck_id
+
+    def _on_change():
+        # The widgets of the config form still hold values for the previous deck
+        for key in [key for key in st.session_state if str(key).endswith("_widget")]:
+            del st.session_state[key]
+        st.session_state["initialized"] = False
+
+    return st.sidebar.selectbox(
+        "Kaartenset",
+        deck_ids,
+        index=deck_ids.index(deck_id) if deck_id in deck_ids else 0,
+        key="deck_picker",
+        on_change=_on_change,
+    )
+
+
+def _get_quiz() -> QuizSession:
+    return st.session_state["quiz"]
+
+
+@st.cache_resource
+def get_prefetch_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(N_WORKERS, thread_name_prefix="prefetch")
+
+
+@st.cache_resource
+def get_media_cache() -> "MediaCache":
+    from flip_cards.media_cache import MAX_MEMORY_BYTES, MediaCache
+
+    max_memory_mb = os.getenv("MEDIA_CACHE_MB")
+    media_cache = MediaCache(
+        os.getenv("MEDIA_CACHE_DIR", ".media_cache"),
+        max_memory_bytes=int(max_memory_mb) * 2**20 if max_memory_mb else MAX_MEMORY_BYTES,
+    )
+    instrumentation.register_gauges("media_cache", lambda: vars(media_cache.stats).copy())
+    return media_cache
+
+
+def fetch_media(question_index: int) -> Optional[object]:
+    # To be customized per use case, e.g. to get the song of a bird, transcoded and cached:
+    #     return get_media_cache().get(Path("media") / f"{question_index}.mp3", "audio")
+    # Runs in a background thread ahead of time, so it should not call Streamlit itself
+    return None
+
+
+def get_media(question_index: int) -> Optional[object]:
+    """Media of a question from fetch_media(), prefetched while earlier questions were shown"""
+    return _get_prefetcher().get(question_index)
+
+
+def _get_prefetcher() -> Prefetcher:
+    if "prefetcher" not in st.session_state:
+        st.session_state["prefetcher"] = Prefetcher(get_prefetch_executor(), fetch_media)
+    return st.session_state["prefetcher"]
+
+
+def prefetch_upcoming():
+    queue = _get_quiz().queue
+    if not queue:
+        _get_prefetcher().cancel()
+        return
+    _get_prefetcher().prefetch([queue.current, *queue.upcoming(N_PREFETCH)])
+
+
+@st.cache_resource
+def get_progress_store() -> Optional["ProgressStore"]:
+    if not os.getenv("PROGRESS_DB"):
+        return None
+    from flip_cards.progress_store import ProgressStore
+
+    return ProgressStore(os.environ["PROGRESS_DB"])
+
+
+@st.cache_resource
+def get_analytics() -> "Analytics":
+    from flip_cards.analytics import FLUSH_INTERVAL, Analytics
+
+    flush_interval = os.getenv("ANALYTICS_FLUSH_INTERVAL")
+    analytics = Analytics(
+        os.getenv("ANALYTICS_DB", ":memory:"),
+        flush_interval=float(flush_interval) if flush_interval else FLUSH_INTERVAL,
+    )
+    instrumentation.register_gauges("analytics", analytics.stats)
+    return analytics
+
+
+def _save_progress():
+    progress_store = get_progress_store()
+    if progress_store is None:
+        return
+    quiz = _get_quiz()
+    snapshot = {"deck_content": quiz.deck.content_id, **quiz.base_snapshot()}
+    progress_store.save_progress(st.session_state["user_id"], st.session_state["deck_id"], snapshot)
+
+
+def _save_progress_step(correct: bool):
+    progress_store = get_progress_store()
+    if progress_store is None:
+        return
+    progress_store.save_step(
+        st.session_state["user_id"], st.session_state["deck_id"], _get_quiz().current, correct
+    )
+
+
+def _restore_progress():
+    progress_store = get_progress_store()
+    if progress_store is None:
+        return
+
+    # The user id lives in the URL, so it survives a browser refresh
+    user_id = st.query_params.get("user") or uuid.uuid4().hex
+    st.query_params["user"] = user_id
+    st.session_state["user_id"] = user_id
+
+    deck = _get_deck()
+    progress = progress_store.load_progress(user_id, st.session_state["deck_id"])
+    if not progress:
+        return
+    snapshot, steps = progress
+    # Versions restart at 1 in every process, so compare the content of the deck instead
+    if snapshot.get("deck_content") != deck.content_id:
+        return
+    if not all(0 <= i < len(deck) for i in snapshot.get("question_indices", ())):
+        return
+
+    # Snapshots from before a config option was added lack it
+    snapshot["config"] = {**Config().dict(), **snapshot["config"]}
+    try:
+        quiz = QuizSession.replay(deck, snapshot, steps)
+    except QuizError:
+        return
+    if quiz.finished:
+        return
+    st.session_state["quiz"] = quiz
+    st.session_state["config"] = quiz.config
+    if quiz.answered:
+        quiz.advance()
+    prefetch_upcoming()
+    define_answer_suggestions()
+    st.session_state["overhoring_started"] = True
+    st.session_state["initialize_queue"] = False
+    st.session_state["answer_checked"] = False
+    st.session_state["clear_answer_field"] = True
+    st.session_state["sidebar_state"] = "collapsed"
+    _toggle_input_focus("on")
+
+
 def welcome_message():
     st.subheader("👈 Start de overhoring")
     # st.snow()
     st.stop()
 
 
-def initialize_session_state(
-    question_objects: List[QuestionObjectType], correct_answers: List[str]
-):
-    st.session_state["counter"] = 0  # Used by focus_on_text_input()
-    st.session_state["question_objects"] = question_objects
-    st.session_state["correct_answers"] = correct_answers
-    st.session_state["all_tags"] = {
-        tag for tags in [q["tags"] for q in question_objects] for tag in tags
-    }
-    st.session_state["total_questions"] = len(question_objects)
+def initialize_session_state(deck: SharedDeck):
+    st.session_state["deck_id"] = deck.deck_id
+    st.session_state["deck_version"] = deck.version
+    st.session_state["total_questions"] = len(deck)
     st.session_state["answer_submitted"] = False
     st.session_state["clear_answer_field"] = False
     st.session_state["next_question"] = False
@@ -137,6 +474,7 @@ def initialize_session_state(
     st.session_state["config"] = Config().dict()  # Actual config used in overhoring
     st.session_state["sidebar_state"] = "expanded"
     st.session_state["initialized"] = True
+    _restore_progress()
 
 
 def _toggle_input_focus(state: str = "off"):
@@ -216,10 +554,9 @@ def _multiselect_selected_questions():
         _toggle_input_focus("off")
         st.session_state["sidebar_state"] = "expanded"
 
-    st.session_state["n_config_comboboxes"] += 1
-
     possible_indices = _get_possible_indices_from_selected_tags("_config")
-    possible_questions = [st.session_state["correct_answers"][i] for i in possible_indices]
+    correct_answers = _get_deck().correct_answers
+    possible_questions = [correct_answers[i] for i in possible_indices]
     st.multiselect(
         "Meegenomen vragen (mag leeg zijn)",
         possible_questions,
@@ -235,14 +572,18 @@ def _multiselect_included_tags():
         _toggle_input_focus("off")
         st.session_state["sidebar_state"] = "expanded"
 
-    st.session_state["n_config_comboboxes"] += 1
+    question_index = _get_deck().index
+    _, _, excluded_tags = _get_filter_key("_config")
 
-    possible_indices = _get_possible_indices_from_excluded_tags("_config")
-    possible_question_objects = [st.session_state["question_objects"][i] for i in possible_indices]
-    possible_tags = {tag for tags in [q["tags"] for q in possible_question_objects] for tag in tags}
+    def _possible_tags() -> List[str]:
+        bits = filter_question_bits(question_index, frozenset(), frozenset(), excluded_tags)
+        return question_index.tags_in_bits(bits)
+
+    # Cached, finding the tags visits the bitset of every tag
+    possible_tags = question_index.filter_cache.get(("tags", excluded_tags), _possible_tags)
     st.multiselect(
         "Meegenomen tags (mag leeg zijn)",
-        list(possible_tags),
+        possible_tags,
         default=st.session_state["_config_default"]["included_tags"],
         key="included_tags_widget",
         on_change=_on_change,
@@ -255,14 +596,12 @@ def _multiselect_excluded_tags():
         _toggle_input_focus("off")
         st.session_state["sidebar_state"] = "expanded"
 
-    st.session_state["n_config_comboboxes"] += 1
-
     if st.session_state["_config"]["selected_questions"]:
         return
 
     possible_tags = [
         tag
-        for tag in st.session_state["all_tags"]
+        for tag in _get_deck().all_tags
         if tag not in st.session_state["_config"]["included_tags"]
     ]
 
@@ -324,10 +663,11 @@ def _select_slider_from_to_questions():
         st.session_state["sidebar_state"] = "expanded"
 
     possible_question_indices = _get_possible_question_indices("_config")
+    correct_answers = _get_deck().correct_answers
 
     def _format_func(i):
         indx = possible_question_indices[i]
-        return f"{st.session_state['correct_answers'][indx]}"
+        return f"{correct_answers[indx]}"
 
     st.select_slider(
         "Selectie van-tot",
@@ -354,8 +694,6 @@ def _select_slider_from_to_questions():
 def config_form():
     # To be customized per use case
 
-    st.session_state["n_config_comboboxes"] = 0
-
     with st.sidebar.container(border=True):
         st.subheader("**Configuratie**")
 
@@ -415,133 +753,79 @@ def config_form():
 
 
 def _get_n_questions_selected(config: str = "config") -> int:
-    return (
-        st.session_state[config]["n_random_questions"]
-        if st.session_state[config]["random_selection"]
-        else st.session_state[config]["question_end_index"]
-        - st.session_state[config]["question_start_index"]
-    )
+    return engine.n_questions_selected(st.session_state[config])
 
 
 def reset_session_state():
-    st.session_state["n_correct"] = 0
     st.session_state["next_question"] = False
     st.session_state["answer_checked"] = False
     st.session_state["answer_submitted"] = False
-    st.session_state["n_questions"] = _get_n_questions_selected()
-    infinite_practice = st.session_state["config"]["infinite_practice"]
-    st.session_state["question_indices_seen"] = [] if infinite_practice else set()
-
-
-def _get_possible_indices_from_selected_questions(config: str = "config"):
-    possible_from_selected_questions = []
-    for i, question_object in enumerate(st.session_state["question_objects"]):
-        correct_answer = st.session_state["correct_answers"][i]
-
-        if st.session_state[config]["selected_questions"]:
-            if correct_answer in st.session_state[config]["selected_questions"]:
-                possible_from_selected_questions.append(i)
-        else:
-            possible_from_selected_questions.append(i)
-    return possible_from_selected_questions
-
-
-def _get_possible_indices_from_included_tags(config: str = "config") -> List[int]:
-    possible_from_included_tags = []
-    for i, question_object in enumerate(st.session_state["question_objects"]):
-        if st.session_state[config]["included_tags"]:
-            for tag in question_object["tags"]:
-                if tag in st.session_state[config]["included_tags"]:
-                    possible_from_included_tags.append(i)
-        else:
-            possible_from_included_tags.append(i)
-    return possible_from_included_tags
-
-
-def _get_possible_indices_from_excluded_tags(config: str = "config") -> List[int]:
-    possible_from_excluded_tags = []
-    for i, question_object in enumerate(st.session_state["question_objects"]):
-        if st.session_state[config]["excluded_tags"]:
-            possible_from_excluded_tags.append(i)
-            for tag in question_object["tags"]:
-                if tag in st.session_state[config]["excluded_tags"]:
-                    possible_from_excluded_tags.pop()
-                    break
-        else:
-            possible_from_excluded_tags.append(i)
-    return possible_from_excluded_tags
 
 
-def _get_possible_indices_from_selected_tags(config: str = "config"):
-    possible_from_included_tags = _get_possible_indices_from_included_tags(config)
-    possible_from_excluded_tags = _get_possible_indices_from_excluded_tags(config)
-    possible_indices = set(possible_from_included_tags).intersection(possible_from_excluded_tags)
+def _get_filter_key(config: str = "config") -> Tuple[FrozenSet[str], ...]:
+    return engine.filter_key(st.session_state[config])
 
-    return sorted(list(possible_indices))
 
+def _get_possible_indices_from_selected_questions(config: str = "config") -> Tuple[int, ...]:
+    selected_questions, _, _ = _get_filter_key(config)
+    return filter_question_indices(_get_deck().index, selected_questions, frozenset(), frozenset())
 
-def _get_possible_question_indices(config: str = "config"):
-    indices_from_selected_questions = _get_possible_indices_from_selected_questions(config)
-    indices_from_selected_tags = _get_possible_indices_from_selected_tags(config)
-    possible_question_indices = list(
-        set(indices_from_selected_questions).intersection(indices_from_selected_tags)
-    )
-    return sorted(possible_question_indices)
 
+def _get_possible_indices_from_included_tags(config: str = "config") -> Tuple[int, ...]:
+    _, included_tags, _ = _get_filter_key(config)
+    return filter_question_indices(_get_deck().index, frozenset(), included_tags, frozenset())
 
-def initialize_queue():
-    possible_question_indices = _get_possible_question_indices()
-    error_msg = (
-        "Oeps, er zijn niet genoeg vragen voor deze filters!"
-        + " Probeer opnieuw met andere filters."
-    )
 
-    if not possible_question_indices:
-        st.write(error_msg)
-        st.stop()
+def _get_possible_indices_from_excluded_tags(config: str = "config") -> Tuple[int, ...]:
+    _, _, excluded_tags = _get_filter_key(config)
+    return filter_question_indices(_get_deck().index, frozenset(), frozenset(), excluded_tags)
 
-    if not st.session_state["config"]["random_selection"]:
-        start_index = st.session_state["config"]["question_start_index"]
-        end_index = st.session_state["config"]["question_end_index"]
-        if end_index > len(possible_question_indices):
-            st.write(error_msg)
-            breakpoint()
 
-            st.stop()
+def _get_possible_indices_from_selected_tags(config: str = "config") -> Tuple[int, ...]:
+    _, included_tags, excluded_tags = _get_filter_key(config)
+    return filter_question_indices(_get_deck().index, frozenset(), included_tags, excluded_tags)
 
-        queue = possible_question_indices[start_index:end_index]
-    else:
-        n_random_questions = st.session_state["config"]["n_random_questions"]
-        if n_random_questions > len(possible_question_indices):
-            st.write(error_msg)
-            st.stop()
-        queue = random.sample(possible_question_indices, n_random_questions)
 
-    if st.session_state["config"]["infinite_practice"]:
-        queue *= int(110000 / len(queue))
-        random.shuffle(queue)
-        queue = queue[:100000]
+def _get_possible_question_indices(config: str = "config") -> Tuple[int, ...]:
+    return engine.possible_question_indices(_get_deck().index, st.session_state[config])
 
-    st.session_state["question_indices"] = queue.copy()
 
-    random.shuffle(queue)
-    st.session_state["queue"] = queue
+def initialize_queue():
+    try:
+        st.session_state["quiz"] = QuizSession(
+            _get_deck(), st.session_state["config"], seed=random.getrandbits(32)
+        )
+    except QuizError:
+        st.write(
+            "Oeps, er zijn niet genoeg vragen voor deze filters!"
+            + " Probeer opnieuw met andere filters."
+        )
+        st.stop()
+    prefetch_upcoming()
+    _save_progress()
     st.session_state["initialize_queue"] = False
 
 
 def define_answer_suggestions():
-    correct_answers = st.session_state["correct_answers"]
-    question_indices = st.session_state["question_indices"]
-    st.session_state["suggestions"] = sorted(
-        list(set([correct_answers[i] for i in question_indices]))
-    )
+    shared_deck = _get_deck()
+    question_indices = _get_quiz().question_indices
+    if len(question_indices) == len(shared_deck):
+        # Shared between sessions for the whole deck
+        st.session_state["suggestions"] = shared_deck.typeahead
+    else:
+        # Filters the shared index instead of copying it into the session
+        st.session_state["suggestions"] = shared_deck.typeahead.restrict(question_indices)
 
 
 def get_current_question_answer_pair():
-    current_index = st.session_state["queue"][0]
+    quiz = _get_quiz()
+    current_index = quiz.current
+    if st.session_state.get("question_shown_at", (None,))[0] != quiz.queue.step:
+        # Reruns while the same question is shown do not restart its answer time
+        st.session_state["question_shown_at"] = (quiz.queue.step, time.monotonic())
     st.session_state["question_index"] = current_index
-    st.session_state["question_object"] = st.session_state["question_objects"][current_index]
-    st.session_state["correct_answer"] = st.session_state["correct_answers"][current_index]
+    deck = _get_deck()
+    st.session_state["correct_answer"] = deck.correct_answers[current_index]
 
 
 def _get_feedback_emoji(correct_perc: float) -> str:
@@ -566,41 +850,55 @@ def _get_feedback_emoji(correct_perc: float) -> str:
 
 
 def show_progress():
-    infinite_practice = st.session_state["config"]["infinite_practice"]
-    answer_submitted = st.session_state["answer_submitted"]
-    queue = st.session_state["queue"]
-
-    n_start = st.session_state["n_questions"] if not infinite_practice else 100000
-
-    if infinite_practice:
-        n_left = len(queue) - 1 if answer_submitted else len(queue)
-    else:
-        n_left = len(
-            set(st.session_state["question_indices"])
-            - set(st.session_state["question_indices_seen"])
-        )
-    n_done = n_start - n_left
-    progress_perc = n_done / n_start
-    progress_msg = f"**Voortgang**: {progress_perc:.0%} ({n_done}/{n_start})"
-
-    n_correct = st.session_state["n_correct"]
-    n_seen = len(st.session_state["question_indices_seen"])
-
-    correct_perc = n_correct / n_seen if n_seen else 0
-    emoji = _get_feedback_emoji(correct_perc) if n_seen else ""
-    correct_msg = f"**Correct**: {correct_perc:.0%} ({n_correct}/{n_seen}) {emoji}"
-    st.progress(progress_perc, f"{progress_msg} -- {correct_msg}")
+    progress = _get_quiz().progress()
+    progress_msg = (
+        f"**Voortgang**: {progress.done_fraction:.0%} ({progress.n_done}/{progress.n_total})"
+    )
+    correct_fraction = progress.correct_fraction
+    emoji = _get_feedback_emoji(correct_fraction) if progress.n_graded else ""
+    correct_msg = (
+        f"**Correct**: {correct_fraction:.0%} ({progress.n_correct}/{progress.n_graded}) {emoji}"
+    )
+    st.progress(progress.done_fraction, f"{progress_msg} -- {correct_msg}")
 
 
 def present_question():
     # To be customized per use case
-    st.write(st.session_state["question_object"]["question"])
+    st.write(_get_deck().deck.question(st.session_state["question_index"]))
 
 
 def _titlelize(text: str) -> str:
     return " ".join([e.capitalize() for e in text.split()])
 
 
+def _typeahead_answer_input(text: str, on_submit: Callable[[], None]):
+    # Only the top suggestions for what is typed so far are sent to the browser
+    def _get_value() -> Dict:
+        value = st.session_state.get("answer_typeahead") or {}
+        # The component keeps its last value, also when a new question is shown
+        return value if value.get("round") == _get_quiz().queue.step else {}
+
+    def _check():
+        value = _get_value()
+        st.session_state["answer_field"] = value.get("answer") or value.get("query", "")
+        on_submit()
+
+    def _on_change():
+        if _get_value().get("submitted"):
+            _check()
+
+    query = _get_value().get("query", "")
+    _typeahead_component(
+        label=text,
+        options=st.session_state["suggestions"].complete(query),
+        round=_get_quiz().queue.step,
+        key="answer_typeahead",
+        default=None,
+        on_change=_on_change,
+    )
+    st.button("Check", on_click=_check)
+
+
 def answer_form(
     text: str,
 ):
@@ -616,21 +914,21 @@ def answer_form(
 
     def _on_click_volgende():
         st.session_state["answer_submitted"] = False
-        st.session_state["queue"].pop(0)
+        _get_quiz().advance()
+        prefetch_upcoming()
         st.session_state["answer_checked"] = False
         st.session_state["clear_answer_field"] = True
         st.session_state["sidebar_state"] = "collapsed"
         _toggle_input_focus("input_field")
 
+    answer_submitted = st.session_state["answer_submitted"]
+    if st.session_state["config"]["answer_suggestions"] and not answer_submitted:
+        _typeahead_answer_input(text, _on_click_check)
+        return
+
     with st.form("answer_form"):
         if not st.session_state["answer_submitted"]:
-            if st.session_state["config"]["answer_suggestions"]:
-                st.selectbox(
-                    text, options=[""] + st.session_state["suggestions"], key="answer_field"
-                )
-            else:
-                st.text_input(text, key="answer_field")
-
+            st.text_input(text, key="answer_field")
             st.form_submit_button("Check", on_click=_on_click_check)
         else:
             feedback_emoji = "✅" if st.session_state["answer_correct"] else "❌"
@@ -644,31 +942,27 @@ def answer_form(
 
 
 def check_answer():
-    given_answer = st.session_state["given_answer"].lower()
-    correct_answer = st.session_state["correct_answer"].lower()
-    correct = given_answer == correct_answer
-
-    infinite_practice = st.session_state["config"]["infinite_practice"]
-
-    question_index = st.session_state["question_index"]
-    unseen_question = question_index not in st.session_state["question_indices_seen"]
-    if correct and (infinite_practice or (not infinite_practice and unseen_question)):
-        st.session_state["n_correct"] += 1
-
+    quiz = _get_quiz()
+    correct = quiz.grade(st.session_state["given_answer"])
     st.session_state["answer_checked"] = True
     st.session_state["answer_correct"] = correct
-    if infinite_practice:
-        st.session_state["question_indices_seen"].append(question_index)
-    else:
-        st.session_state["question_indices_seen"].add(question_index)
+
+    step, shown_at = st.session_state.get("question_shown_at", (None, 0.0))
+    seconds = time.monotonic() - shown_at if step == quiz.queue.step else math.nan
+    get_analytics().record(quiz.deck, quiz.current, correct, seconds)
+
+    progress_store = get_progress_store()
+    if progress_store is not None:
+        progress_store.record_answer(
+            st.session_state["user_id"], st.session_state["deck_id"], quiz.current, correct
+        )
 
 
 def update_queue():
-    if st.session_state["answer_correct"] or st.session_state["config"]["infinite_practice"]:
-        return
-    question_index = st.session_state["question_index"]
-    insert_index = min(random.randint(3, 8), len(st.session_state["queue"]))
-    st.session_state["queue"].insert(insert_index, question_index)
+    _get_quiz().reschedule(st.session_state["answer_correct"])
+    _save_progress_step(st.session_state["answer_correct"])
+    # The answer decides when the question comes back, which may change the next questions
+    prefetch_upcoming()
 
 
 def show_feedback_message():
@@ -685,17 +979,19 @@ def show_feedback_message():
 
 
 def show_tags():
-    st.write(" ".join([f"`{t}`" for t in st.session_state["question_object"]["tags"]]))
+    tags = _get_deck().deck.tags(st.session_state["question_index"])
+    st.write(" ".join([f"`{t}`" for t in tags]))
 
 
 def present_question_information():
     # To be customized per use case
     show_tags()
-    st.write(st.session_state["question_object"]["info"])
+    st.write(_get_deck().deck.info(st.session_state["question_index"]))
 
 
 def next_question():
-    st.session_state["queue"].pop(0)
+    _get_quiz().advance()
+    prefetch_upcoming()
     st.session_state["next_question"] = False
     st.session_state["answer_checked"] = False
     st.session_state["clear_answer_field"] = True
@@ -709,7 +1005,7 @@ def stop_overhoring():
     if st.button("Volgende"):
         st.session_state["overhoring_started"] = False
         st.rerun()
-    focus_on_next_button_in_form()
+    _focus("button", "Volgende")
     st.stop()
 
 
@@ -718,99 +1014,19 @@ def clear_answer_field():
     st.session_state["clear_answer_field"] = False
 
 
-def focus_on_input_in_form():
-    st.session_state["counter"] += 1
-    if st.session_state["config"]["answer_suggestions"]:
-        components.html(
-            f"""
-                <div id="selectbox-count"></div>
-                <p>{st.session_state.counter}</p>
-                <script>
-                    let retries = 0;
-                    const maxRetries = 50;
-                    function focusSelectBoxInput() {{
-                        var selectBoxes = window.parent.document.querySelectorAll('[role="combobox"]');
-                        if (selectBoxes.length > {st.session_state["n_config_comboboxes"]}) {{
-                            selectBoxes[{st.session_state["n_config_comboboxes"]}].focus();
-                        }} else if (retries < maxRetries) {{
-                            retries += 1;
-                            setTimeout(focusSelectBoxInput, 100);
-                        }}
-                    }}
-                    // Optionally, use MutationObserver for more robustness:
-                    const observer = new window.parent.MutationObserver((mutations, obs) => {{
-                        var selectBoxes = window.parent.document.querySelectorAll('[role="combobox"]');
-                        if (selectBoxes.length > {st.session_state["n_config_comboboxes"]}) {{
-                            selectBoxes[{st.session_state["n_config_comboboxes"]}].focus();
-                            obs.disconnect();
-                        }}
-                    }});
-                    observer.observe(window.parent.document.body, {{ childList: true, subtree: true }});
-                    // Fallback in case observer doesn't fire:
-                    focusSelectBoxInput();
-                </script>
-            """,
-            height=0,
-        )
-    else:
-        components.html(
-            f"""
-                <div id="text-input-count"></div>
-                <p>{st.session_state.counter}</p>
-                <script>
-                    let retries = 0;
-                    const maxRetries = 50;
-                    function focusTextInput() {{
-                        var textInputs = window.parent.document.querySelectorAll("input[type=text]");
-                        if (textInputs.length > 0) {{
-                            textInputs[0].focus();
-                        }} else if (retries < maxRetries) {{
-                            retries += 1;
-                            setTimeout(focusTextInput, 100);
-                        }}
-                    }}
-                    // Use MutationObserver for robustness:
-                    const observer = new window.parent.MutationObserver((mutations, obs) => {{
-                        var textInputs = window.parent.document.querySelectorAll("input[type=text]");
-                        if (textInputs.length > 0) {{
-                            textInputs[0].focus();
-                            obs.disconnect();
-                        }}
-                    }});
-                    observer.observe(window.parent.document.body, {{ childList: true, subtree: true }});
-                    // Fallback in case observer doesn't fire:
-                    focusTextInput();
-                </script>
-            """,
-            height=0,
-        )
+def _focus(kind: Optional[str], label: Optional[str]):
+    # Always rendered with the same key, so the component is mounted once and only its
+    # arguments change between reruns
+    _focus_component(
+        kind=kind, label=label, round=_get_quiz().queue.step, key="focus", default=None
+    )
 
 
-def focus_on_next_button_in_form():
-    components.html(
-        """
-        <script>
-            function focusNextButton() {
-                var buttons = window.parent.document.querySelectorAll('button');
-                for (var i = 0; i < buttons.length; ++i) {
-                    if (buttons[i].innerText === "Volgende") {
-                        buttons[i].focus();
-                        return true;
-                    }
-                }
-                return false;
-            }
-            // Try immediately
-            if (!focusNextButton()) {
-                // Use MutationObserver for robustness
-                const observer = new window.parent.MutationObserver((mutations, obs) => {
-                    if (focusNextButton()) {
-                        obs.disconnect();
-                    }
-                });
-                observer.observe(window.parent.document.body, { childList: true, subtree: true });
-            }
-        </script>
-        """,
-        height=0,
-    )
+def focus_in_form(text: str):
+    answer_suggestions = st.session_state["config"]["answer_suggestions"]
+    if st.session_state["focus_on_next_button"]:
+        _focus("button", "Volgende")
+    elif st.session_state["focus_on_input"] and not answer_suggestions:
+        _focus("input", text)
+    else:
+        _focus(None, None)  # The typeahead focuses its own input when a new question is shown
@@ -0,0 +1,129 @@
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+BUCKET_CAPACITY = 5  # Attempts in a burst
+BUCKET_REFILL_SECONDS = 60.0  # Seconds per regained attempt
+LOCKOUT_SECONDS = 3.0  # After every wrong password
+TOKEN_TTL_SECONDS = 12 * 60 * 60
+MAX_CLIENTS = 10000
+
+
+class AuthResult(NamedTuple):
+    ok: bool
+    retry_after: float = 0.0  # Seconds until the client may try again
+    rate_limited: bool = False  # Refused before the password was compared
+
+
+class _ClientState:
+    __slots__ = ("tokens", "updated", "locked_until")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.locked_until = 0.0
+
+
+class RateLimiter:
+    """Token bucket per client, plus a lockout after every failed attempt
+
+    Callers are told how long to wait instead of being put to sleep, so a burst of attempts
+    does not hold on to server threads.
+    """
+
+    def __init__(
+        self,
+        capacity: int = BUCKET_CAPACITY,
+        refill_seconds: float = BUCKET_REFILL_SECONDS,
+        lockout_seconds: float = LOCKOUT_SECONDS,
+        max_clients: int = MAX_CLIENTS,
+    ):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.lockout_seconds = lockout_seconds
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, _ClientState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_state(self, client: str, now: float) -> _ClientState:
+        state = self._clients.get(client)
+        if state is None:
+            state = self._clients[client] = _ClientState(self.capacity, now)
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+            state.tokens = min(
+                self.capacity, state.tokens + (now - state.updated) / self.refill_seconds
+            )
+            state.updated = now
+        return state
+
+    def acquire(self, client: str, now: Optional[float] = None) -> AuthResult:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._get_state(client, now)
+            if state.locked_until > now:
+                return AuthResult(False, state.locked_until - now, rate_limited=True)
+            if state.tokens < 1:
+                retry_after = (1 - state.tokens) * self.refill_seconds
+                return AuthResult(False, retry_after, rate_limited=True)
+            state.tokens -= 1
+            return AuthResult(True)
+
+    def lock_out(self, client: str, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._get_state(client, now).locked_until = now + self.lockout_seconds
+
+
+class Authenticator:
+    """Checks the app password and issues signed session tokens
+
+    A session that holds a valid token skips the password check, which is a single HMAC.
+    Without a configured secret, tokens are only valid for the lifetime of the process.
+    """
+
+    def __init__(
+        self,
+        password: str,
+        secret: Optional[bytes] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        token_ttl: float = TOKEN_TTL_SECONDS,
+    ):
+        self._password = password.encode()
+        self._secret = secret or secrets.token_bytes(32)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.token_ttl = token_ttl
+
+    def check_password(self, client: str, password: str, now: Optional[float] = None) -> AuthResult:
+        result = self.rate_limiter.acquire(client, now)
+        if not result.ok:
+            return result
+        if hmac.compare_digest(password.encode(), self._password):
+            return AuthResult(True)
+        self.rate_limiter.lock_out(client, now)
+        return AuthResult(False, self.rate_limiter.lockout_seconds)
+
+    def _sign(self, payload: str) -> str:
+        return hmac.new(self._secret, payload.encode(), hashlib.sha256).hexdigest()
+
+    def issue_token(self, now: Optional[float] = None) -> str:
+        now = time.time() if now is None else now
+        payload = f"{int(now + self.token_ttl)}.{secrets.token_hex(8)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify_token(self, token: Optional[str], now: Optional[float] = None) -> bool:
+        if not token:
+            return False
+        payload, _, signature = token.rpartition(".")
+        # As bytes, tokens come from cookies and may hold anything
+        if not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+            return False
+        expires, _, _ = payload.partition(".")
+        now = time.time() if now is None else now
+        return expires.isdigit() and int(expires) > now
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import logging
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from flip_cards import deck_format, loaders
+from flip_cards.deck import Deck, DeckBuilder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BuildStats:
+    rows: int
+    reused_rows: int
+    seconds: float
+
+    @property
+    def processed_rows(self) -> int:
+        return self.rows - self.reused_rows
+
+
+def row_hash(row: loaders.Row) -> bytes:
+    encoded = json.dumps(row, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=deck_format.ROW_HASH_SIZE).digest()
+
+
+def _open_previous_build(path: Path) -> Optional[deck_format.MappedDeck]:
+    if not path.exists():
+        return None
+    try:
+        previous = deck_format.open_deck(path)
+    except deck_format.DeckFormatError:
+        logger.warning("Ignoring %s for incremental build, it is not a readable deck", path)
+        return None
+    return previous if previous.row_hashes() is not None else None
+
+
+def build_deck(
+    source: Union[str, Path],
+    previous: Optional[Deck] = None,
+    chunk_size: int = loaders.CHUNK_SIZE,
+) -> Tuple[Deck, BuildStats]:
+    """Reads a raw deck source, with the content hash of every row
+
+    Rows whose hash is found in the previous deck are copied from it instead of being
+    validated and normalized again.
+    """
+    start = time.perf_counter()
+    previous_hashes = previous.row_hashes() if previous is not None else None
+    previous_rows: Dict[bytes, int] = (
+        {h: i for i, h in enumerate(previous_hashes)} if previous_hashes else {}
+    )
+
+    builder = DeckBuilder()
+    row_hashes: List[bytes] = []
+    n_reused = 0
+    for chunk in loaders.iter_row_chunks(source, chunk_size):
+        for row in chunk:
+            h = row_hash(row)
+            j = previous_rows.get(h)
+            if j is not None:
+                builder.add(
+                    question=previous.question(j),
+                    answer=previous.answer(j),
+                    tags=previous.tags(j),
+                    info=previous.info(j),
+                    **{key: column[j] for key, column in previous.extra_columns.items()},
+                )
+                n_reused += 1
+            else:
+                builder.add(**loaders.normalize_row(row, len(builder) + 1))
+            row_hashes.append(h)
+
+    if not len(builder):
+        raise loaders.DeckLoadError(f"No cards found in {source}")
+    stats = BuildStats(len(builder), n_reused, time.perf_counter() - start)
+    return builder.build(row_hashes=row_hashes), stats
+
+
+def build_deck_file(
+    source: Union[str, Path],
+    output: Union[str, Path],
+    incremental: bool = True,
+    chunk_size: int = loaders.CHUNK_SIZE,
+) -> BuildStats:
+    """Compiles a raw deck source into a deck file that the app can map without preprocessing
+
+    With incremental builds, rows that did not change since the previous output are reused.
+    """
+    start = time.perf_counter()
+    output = Path(output)
+    previous = _open_previous_build(output) if incremental else None
+    deck, stats = build_deck(source, previous, chunk_size)
+
+    # The previous output is replaced atomically, so it can stay mapped while writing
+    deck_format.write_deck(deck, output, row_hashes=deck.row_hashes())
+
+    stats.seconds = time.perf_counter() - start
+    logger.info(
+        "Built %s from %s: %d cards, %d reused, %d processed in %.2fs",
+        output,
+        source,
+        stats.rows,
+        stats.reused_rows,
+        stats.processed_rows,
+        stats.seconds,
+    )
+    return stats
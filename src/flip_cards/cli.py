@@ -0,0 +1,151 @@
+import argparse
+from typing import List, Optional
+
+from flip_cards.config import Config
+
+
+def _build(args: argparse.Namespace):
+    from pathlib import Path
+
+    from flip_cards.build import build_deck_file
+    from flip_cards.deck_format import SUFFIX
+
+    output = args.output or Path(args.source).with_suffix(SUFFIX)
+    stats = build_deck_file(args.source, output, incremental=not args.full)
+    print(
+        f"{output}: {stats.rows} cards ({stats.reused_rows} reused, "
+        f"{stats.processed_rows} processed) in {stats.seconds:.2f}s"
+    )
+
+
+def _drill(args: argparse.Namespace):
+    import operator
+    import os
+    import sys
+
+    from flip_cards.deck_store import DEFAULT_DECK_ID, SharedDeck
+    from flip_cards.drill import DrillStats, run_session, scripted_answers, simulated_answers
+    from flip_cards.engine import QuizError, QuizSession, possible_question_indices
+
+    deck_path = args.deck or os.getenv("DECK_PATH")
+    if not deck_path:
+        raise SystemExit("No deck given, pass DECK or set DECK_PATH")
+    from flip_cards import deck_format
+
+    if deck_path.endswith(deck_format.SUFFIX):
+        deck = deck_format.open_deck(deck_path)
+    else:
+        from flip_cards.loaders import load_deck
+
+        deck, _ = load_deck(deck_path)
+    shared_deck = SharedDeck(DEFAULT_DECK_ID, 1, deck, deck.answers)
+
+    config = Config().dict()
+    config["included_tags"] = args.tag
+    config["excluded_tags"] = args.exclude_tag
+    config["infinite_practice"] = args.infinite
+    config["answer_tolerance"] = args.tolerance
+    if args.questions:
+        config["random_selection"] = True
+        config["n_random_questions"] = args.questions
+    else:
+        config["random_selection"] = False
+        config["question_start_index"] = 0
+        config["question_end_index"] = len(possible_question_indices(shared_deck.index, config))
+
+    progress_store = None
+    if args.progress_db:
+        from flip_cards.progress_store import ProgressStore
+
+        progress_store = ProgressStore(args.progress_db)
+
+    scripted = args.answers is not None or args.simulate is not None
+    answer_lines = None
+    if args.answers is not None:
+        with open(args.answers, encoding="utf-8") as f:
+            answer_lines = iter([line.rstrip("\n") for line in f])
+
+    def _ask(question_index: int):
+        try:
+            return input("> ")
+        except EOFError:
+            return None
+
+    stats = DrillStats()
+    n_sessions = args.sessions if scripted else 1
+    for i in range(n_sessions):
+        seed = None if args.seed is None else args.seed + i
+        try:
+            session = QuizSession(shared_deck, config, seed=seed)
+        except QuizError as e:
+            raise SystemExit(str(e))
+        if answer_lines is not None:
+            answer = scripted_answers(answer_lines)
+        elif args.simulate is not None:
+            answer = simulated_answers(session, args.simulate, seed=seed)
+        else:
+            answer = _ask
+        run_session(
+            session,
+            answer,
+            stats,
+            output=None if args.quiet else sys.stdout,
+            max_answers=args.max_answers,
+            progress_store=progress_store,
+            user_id=f"drill-{i}",
+        )
+        if answer_lines is not None and not operator.length_hint(answer_lines):
+            break
+
+    if progress_store is not None:
+        progress_store.close()
+    if scripted:
+        print(
+            f"{stats.sessions} sessions, {stats.answers} answers ({stats.correct} correct) "
+            f"in {stats.seconds:.2f}s, {stats.answers_per_second:.0f} answers/s"
+        )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="flip-cards")
+    subparsers = parser.add_subparsers(required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="Compile a CSV, JSONL or Parquet deck into a .flipdeck file"
+    )
+    build_parser.add_argument("source", help="Raw deck file")
+    build_parser.add_argument("-o", "--output", help="Deck file, defaults to SOURCE.flipdeck")
+    build_parser.add_argument(
+        "--full", action="store_true", help="Reprocess all rows instead of only changed ones"
+    )
+    build_parser.set_defaults(func=_build)
+
+    drill_parser = subparsers.add_parser(
+        "drill", help="Practice in the terminal, or run scripted sessions to generate load"
+    )
+    drill_parser.add_argument("deck", nargs="?", help="Deck file, defaults to DECK_PATH")
+    drill_parser.add_argument("-n", "--questions", type=int, help="Random selection of questions")
+    drill_parser.add_argument("--tag", action="append", default=[], help="Only these tags")
+    drill_parser.add_argument("--exclude-tag", action="append", default=[], help="Not these tags")
+    drill_parser.add_argument("--infinite", action="store_true", help="Practice infinitely")
+    drill_parser.add_argument("--tolerance", type=int, default=Config.ANSWER_TOLERANCE)
+    drill_parser.add_argument("--seed", type=int)
+    script_group = drill_parser.add_mutually_exclusive_group()
+    script_group.add_argument("--answers", help="File with one answer per line to give")
+    script_group.add_argument(
+        "--simulate", type=float, metavar="ACCURACY", help="Answer correctly with this probability"
+    )
+    drill_parser.add_argument("--sessions", type=int, default=1, help="Scripted sessions to run")
+    drill_parser.add_argument("--max-answers", type=int, help="Per session")
+    drill_parser.add_argument("--progress-db", help="Also write answers and progress to SQLite")
+    drill_parser.add_argument("-q", "--quiet", action="store_true", help="Only print a summary")
+    drill_parser.set_defaults(func=_drill)
+
+    args = parser.parse_args(argv)
+    # Not configuring logging keeps it from being imported on the drill path. Warnings and
+    # errors still reach stderr through the last resort handler of logging.
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ class Config:
     # If True, will multiply the species list by a large number (so not really infinite)
     INFINITE_PRACTICE = False
 
+    ANSWER_TOLERANCE = 1  # Number of typos (edits) that is still accepted as a correct answer
+
     SELECTED_QUESTIONS = []
     INCLUDED_TAGS = []
     EXCLUDED_TAGS = []
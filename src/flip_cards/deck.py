@@ -0,0 +1,223 @@
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from flip_cards.index import bits_from_indices
+from flip_cards.matching import TrigramIndex, normalize_answer
+from flip_cards.typeahead import Typeahead
+
+BASE_FIELDS = ("question", "info", "tags")
+
+
+class CardView(Mapping):
+    """Read-only question object of a single card, backed by the columns of its deck"""
+
+    __slots__ = ("_deck", "_index")
+
+    def __init__(self, deck: "Deck", index: int):
+        self._deck = deck
+        self._index = index
+
+    def __getitem__(self, key: str):
+        if key == "question":
+            return self._deck.question(self._index)
+        if key == "info":
+            return self._deck.info(self._index)
+        if key == "tags":
+            return self._deck.tags(self._index)
+        return self._deck.extra_columns[key][self._index]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from BASE_FIELDS
+        yield from self._deck.extra_columns
+
+    def __len__(self) -> int:
+        return len(BASE_FIELDS) + len(self._deck.extra_columns)
+
+
+class Deck(Sequence):
+    """Columnar deck
+
+    Answers and questions are kept as interned strings, tags as integer codes in CSR form
+    (card i has the tag codes tag_codes[tag_offsets[i]:tag_offsets[i + 1]]) and info texts as
+    a single UTF-8 blob that is only decoded for the card that is shown. Indexing the deck
+    gives a read-only question object, so the deck can be used as the question_objects of
+    prepare_question_answer_pairs.
+    """
+
+    def __init__(
+        self,
+        questions: Sequence,
+        answers: Sequence,
+        tag_vocabulary: Tuple[str, ...],
+        tag_offsets: Sequence[int],
+        tag_codes: Sequence[int],
+        info_offsets: Sequence[int],
+        info_blob: Union[bytes, memoryview],
+        extra_columns: Optional[Dict[str, Sequence]] = None,
+        tag_indices: Optional[List[List[int]]] = None,
+        row_hashes: Optional[List[bytes]] = None,
+    ):
+        assert len(questions) == len(answers) == len(tag_offsets) - 1 == len(info_offsets) - 1
+        self.questions = questions
+        self.answers = answers
+        self.tag_vocabulary = tag_vocabulary
+        self.tag_offsets = tag_offsets
+        self.tag_codes = tag_codes
+        self.info_offsets = info_offsets
+        self.info_blob = info_blob
+        self.extra_columns = extra_columns or {}
+        self._tag_indices = tag_indices
+        self._row_hashes = row_hashes
+        self._suggestions: Optional[List[str]] = None
+
+    @classmethod
+    def from_question_objects(
+        cls, question_objects: Iterable[Mapping], correct_answers: Iterable[str]
+    ) -> "Deck":
+        builder = DeckBuilder()
+        for question_object, correct_answer in zip(question_objects, correct_answers):
+            builder.add(
+                question=question_object["question"],
+                answer=correct_answer,
+                tags=question_object["tags"],
+                info=question_object.get("info", ""),
+                **{k: v for k, v in question_object.items() if k not in BASE_FIELDS},
+            )
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def __getitem__(self, index: int) -> CardView:
+        if isinstance(index, slice):
+            raise TypeError("Decks cannot be sliced, index the cards one at a time")
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("deck index out of range")
+        return CardView(self, index)
+
+    def question(self, index: int) -> str:
+        return self.questions[index]
+
+    def answer(self, index: int) -> str:
+        return self.answers[index]
+
+    def answer_key(self, index: int) -> str:
+        """Normalized answer, as compared by check_answer"""
+        return normalize_answer(self.answers[index])
+
+    def answer_keys(self) -> Sequence[str]:
+        return [normalize_answer(answer) for answer in self.answers]
+
+    def trigram_index(self) -> Optional[TrigramIndex]:
+        """Prebuilt index of the answer keys, only stored in deck files"""
+        return None
+
+    def typeahead(self) -> Optional[Typeahead]:
+        """Prebuilt typeahead of the answers, only stored in deck files"""
+        return None
+
+    def suggestions(self) -> Sequence[str]:
+        """Sorted distinct answers of the deck"""
+        if self._suggestions is None:
+            self._suggestions = sorted(set(self.answers))
+        return self._suggestions
+
+    def tag_codes_of(self, index: int) -> Sequence[int]:
+        return self.tag_codes[self.tag_offsets[index] : self.tag_offsets[index + 1]]
+
+    def tags(self, index: int) -> Tuple[str, ...]:
+        return tuple(self.tag_vocabulary[code] for code in self.tag_codes_of(index))
+
+    def info(self, index: int) -> str:
+        start, end = self.info_offsets[index], self.info_offsets[index + 1]
+        return str(self.info_blob[start:end], "utf-8")
+
+    def row_hashes(self) -> Optional[List[bytes]]:
+        """Content hashes of the source rows, when the deck was built with them"""
+        return self._row_hashes
+
+    def nbytes(self) -> int:
+        """Estimate of the memory held by the deck, counting shared strings once"""
+        strings = {id(s): s for column in (self.questions, self.answers) for s in column}
+        n_bytes = sum(sys.getsizeof(s) for s in strings.values())
+        n_bytes += sys.getsizeof(self.questions) + sys.getsizeof(self.answers)
+        for column in (self.tag_offsets, self.tag_codes, self.info_offsets, self.info_blob):
+            n_bytes += memoryview(column).nbytes
+        for column in self.extra_columns.values():
+            n_bytes += sys.getsizeof(column) + sum(sys.getsizeof(v) for v in column)
+        return n_bytes
+
+    def tag_indices(self) -> List[List[int]]:
+        """Indices of the cards per tag code"""
+        if self._tag_indices is None:
+            tag_indices: List[List[int]] = [[] for _ in self.tag_vocabulary]
+            for i in range(len(self)):
+                for code in self.tag_codes_of(i):
+                    tag_indices[code].append(i)
+            self._tag_indices = tag_indices
+        return self._tag_indices
+
+    def tag_bits(self) -> Dict[str, int]:
+        """Bitset of the cards per tag, see flip_cards.index"""
+        return {
+            tag: bits_from_indices(indices)
+            for tag, indices in zip(self.tag_vocabulary, self.tag_indices())
+        }
+
+
+class DeckBuilder:
+    """Appends cards one by one to the columns of a new deck and to its tag index"""
+
+    def __init__(self):
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.tag_vocabulary: Dict[str, int] = {}
+        self.tag_offsets = array("I", [0])
+        self.tag_codes = array("I")
+        self.tag_indices: List[List[int]] = []
+        self.info_offsets = array("Q", [0])
+        self.info_chunks: List[bytes] = []
+        self.extra_columns: Dict[str, List] = {}
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def add(self, question: str, answer: str, tags: Iterable[str], info: str = "", **extra):
+        index = len(self.answers)
+        self.questions.append(sys.intern(question))
+        self.answers.append(sys.intern(answer))
+
+        for tag in dict.fromkeys(tags):  # Deduplicated, in order
+            code = self.tag_vocabulary.setdefault(tag, len(self.tag_vocabulary))
+            if code == len(self.tag_indices):
+                self.tag_indices.append([])
+            self.tag_codes.append(code)
+            self.tag_indices[code].append(index)
+        self.tag_offsets.append(len(self.tag_codes))
+
+        encoded_info = info.encode("utf-8")
+        self.info_chunks.append(encoded_info)
+        self.info_offsets.append(self.info_offsets[-1] + len(encoded_info))
+
+        for key in extra.keys() - self.extra_columns.keys():
+            self.extra_columns[key] = [None] * index
+        for key, column in self.extra_columns.items():
+            column.append(extra.get(key))
+
+    def build(self, row_hashes: Optional[List[bytes]] = None) -> "Deck":
+        return Deck(
+            questions=tuple(self.questions),
+            answers=tuple(self.answers),
+            tag_vocabulary=tuple(self.tag_vocabulary),
+            tag_offsets=self.tag_offsets,
+            tag_codes=self.tag_codes,
+            info_offsets=self.info_offsets,
+            info_blob=b"".join(self.info_chunks),
+            extra_columns={key: tuple(column) for key, column in self.extra_columns.items()},
+            tag_indices=self.tag_indices,
+            row_hashes=row_hashes,
+        )
@@ -0,0 +1,274 @@
+"""Binary on-disk deck format, opened with mmap
+
+Layout (little-endian, every section aligned to 8 bytes):
+
+    header          MAGIC, format version, number of cards, number of sections
+    section table   per section: name (32 bytes, NUL padded), offset, length
+    sections        string tables (an offsets array of n + 1 uint64 followed by a UTF-8 blob),
+                    the tag CSR arrays (uint32), one bitset of ceil(n / 8) bytes per tag, the
+                    trigram index of the answer keys (see matching.TrigramIndex), the
+                    typeahead arrays (see typeahead.Typeahead) and optionally a 16 byte
+                    content hash per source row
+
+Nothing but the header, the section table and the tag vocabulary is read when a deck is
+opened. Card texts are decoded from the mapped pages when they are accessed, so worker
+processes opening the same file share the page cache instead of each holding a copy.
+"""
+
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from flip_cards.deck import Deck
+from flip_cards.index import MappedTagBits
+from flip_cards.matching import TrigramIndex, all_keys
+from flip_cards.typeahead import Typeahead
+
+SUFFIX = ".flipdeck"
+MAGIC = b"FLIPDECK"
+VERSION = 2  # Bumped whenever normalize_answer changes the stored answer keys
+ROW_HASH_SIZE = 16
+
+_HEADER = struct.Struct("<8sIII")
+_SECTION = struct.Struct("<32sQQ")
+_ALIGNMENT = 8
+_EXTRA_PREFIX = "extra:"
+
+
+class DeckFormatError(ValueError):
+    pass
+
+
+class StringColumn(Sequence):
+    """Column of strings in a string table, decoded on access"""
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("column index out of range")
+        return str(self._blob[self._offsets[index] : self._offsets[index + 1]], "utf-8")
+
+
+class JsonColumn(StringColumn):
+    """Column of arbitrary JSON values in a string table, decoded on access"""
+
+    def __getitem__(self, index: int):
+        if isinstance(index, slice):
+            return super().__getitem__(index)
+        import json  # Not imported with the module, most decks have no extra columns
+
+        return json.loads(super().__getitem__(index))
+
+
+def _string_table(values: Iterable[str]) -> Tuple[bytes, bytes]:
+    offsets = array("Q", [0])
+    chunks: List[bytes] = []
+    for value in values:
+        encoded = value.encode("utf-8")
+        chunks.append(encoded)
+        offsets.append(offsets[-1] + len(encoded))
+    return offsets.tobytes(), b"".join(chunks)
+
+
+def _deck_sections(deck: Deck) -> Dict[str, bytes]:
+    sections: Dict[str, bytes] = {}
+    answer_keys = deck.answer_keys()
+    trigram_index = TrigramIndex.build(all_keys(answer_keys, deck.extra_columns.get("aliases")))
+    typeahead = Typeahead.build(deck.answers)
+    for name, values in (
+        ("answers", deck.answers),
+        ("answers.keys", answer_keys),
+        ("suggestions", typeahead.answers),
+        ("typeahead.keys", typeahead.keys),
+        ("questions", deck.questions),
+        ("info", (deck.info(i) for i in range(len(deck)))),
+        ("tags.vocabulary", deck.tag_vocabulary),
+        ("matcher.keys", trigram_index.keys),
+        ("matcher.trigrams", trigram_index.trigrams),
+    ):
+        sections[f"{name}.offsets"], sections[f"{name}.blob"] = _string_table(values)
+    sections["matcher.posting_offsets"] = array("Q", trigram_index.posting_offsets).tobytes()
+    sections["matcher.postings"] = array("I", trigram_index.postings).tobytes()
+    sections["typeahead.answer_ids"] = array("I", typeahead.answer_ids).tobytes()
+    sections["typeahead.card_answers"] = array("I", typeahead.card_answer_ids).tobytes()
+
+    sections["tags.offsets"] = array("I", deck.tag_offsets).tobytes()
+    sections["tags.codes"] = array("I", deck.tag_codes).tobytes()
+
+    n_bitset_bytes = (len(deck) + 7) // 8
+    tag_bits = deck.tag_bits()
+    sections["tags.bits"] = b"".join(
+        tag_bits[tag].to_bytes(n_bitset_bytes, "little") for tag in deck.tag_vocabulary
+    )
+
+    import json
+
+    for key, column in deck.extra_columns.items():
+        values = (json.dumps(value, ensure_ascii=False) for value in column)
+        name = f"{_EXTRA_PREFIX}{key}"
+        sections[f"{name}.offsets"], sections[f"{name}.blob"] = _string_table(values)
+    return sections
+
+
+def _pad(n: int) -> int:
+    return -n % _ALIGNMENT
+
+
+def write_sections(path: Union[str, os.PathLike], n_cards: int, sections: Dict[str, bytes]):
+    """Writes the sections atomically, so decks that are mapped by running workers stay valid"""
+    for name in sections:
+        if len(name.encode("utf-8")) > 32:
+            raise DeckFormatError(f"Section name '{name}' is longer than 32 bytes")
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    offset += _pad(offset)
+    table = []
+    for name, data in sections.items():
+        table.append(_SECTION.pack(name.encode("utf-8"), offset, len(data)))
+        offset += len(data) + _pad(len(data))
+
+    path = os.fspath(path)
+    # Unique per writer, so concurrent builds of the same deck do not share a temporary file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, n_cards, len(sections)))
+        f.write(b"".join(table))
+        f.write(bytes(_pad(f.tell())))
+        for data in sections.values():
+            f.write(data)
+            f.write(bytes(_pad(len(data))))
+    os.replace(tmp_path, path)
+
+
+def write_deck(
+    deck: Deck, path: Union[str, os.PathLike], row_hashes: Optional[Sequence[bytes]] = None
+):
+    sections = _deck_sections(deck)
+    if row_hashes is not None:
+        assert len(row_hashes) == len(deck)
+        assert all(len(row_hash) == ROW_HASH_SIZE for row_hash in row_hashes)
+        sections["rows.hashes"] = b"".join(row_hashes)
+    write_sections(path, len(deck), sections)
+
+
+class MappedDeck(Deck):
+    """Deck backed by a memory-mapped deck file"""
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # Empty files cannot be mapped
+                raise DeckFormatError(f"{self.path} is empty, not a deck file") from None
+        self._buffer = memoryview(self._mmap)
+
+        if len(self._buffer) < _HEADER.size:
+            raise DeckFormatError(f"{self.path} is not a deck file")
+        magic, version, n_cards, n_sections = _HEADER.unpack_from(self._buffer)
+        if magic != MAGIC:
+            raise DeckFormatError(f"{self.path} is not a deck file")
+        if version != VERSION:
+            raise DeckFormatError(f"{self.path} has format version {version}, expected {VERSION}")
+        if len(self._buffer) < _HEADER.size + n_sections * _SECTION.size:
+            raise DeckFormatError(f"{self.path} is truncated")
+
+        self.sections: Dict[str, memoryview] = {}
+        for i in range(n_sections):
+            name, offset, length = _SECTION.unpack_from(
+                self._buffer, _HEADER.size + i * _SECTION.size
+            )
+            if offset + length > len(self._buffer):
+                raise DeckFormatError(f"{self.path} is truncated")
+            self.sections[name.rstrip(b"\0").decode("utf-8")] = self._buffer[
+                offset : offset + length
+            ]
+
+        extra_columns = {
+            name[len(_EXTRA_PREFIX) : -len(".offsets")]: self._column(
+                name[: -len(".offsets")], JsonColumn
+            )
+            for name in self.sections
+            if name.startswith(_EXTRA_PREFIX) and name.endswith(".offsets")
+        }
+        super().__init__(
+            questions=self._column("questions"),
+            answers=self._column("answers"),
+            tag_vocabulary=tuple(self._column("tags.vocabulary")),
+            tag_offsets=self.sections["tags.offsets"].cast("I"),
+            tag_codes=self.sections["tags.codes"].cast("I"),
+            info_offsets=self.sections["info.offsets"].cast("Q"),
+            info_blob=self.sections["info.blob"],
+            extra_columns=extra_columns,
+        )
+        assert len(self.answers) == n_cards
+
+    def _column(self, name: str, column_type=StringColumn) -> StringColumn:
+        offsets = self.sections[f"{name}.offsets"].cast("Q")
+        return column_type(offsets, self.sections[f"{name}.blob"])
+
+    def answer_key(self, index: int) -> str:
+        if "answers.keys.offsets" not in self.sections:
+            return super().answer_key(index)
+        return self._column("answers.keys")[index]
+
+    def answer_keys(self) -> Sequence[str]:
+        if "answers.keys.offsets" not in self.sections:
+            return super().answer_keys()
+        return self._column("answers.keys")
+
+    def trigram_index(self) -> Optional[TrigramIndex]:
+        if "matcher.postings" not in self.sections:
+            return None
+        return TrigramIndex(
+            self._column("matcher.keys"),
+            self._column("matcher.trigrams"),
+            self.sections["matcher.posting_offsets"].cast("Q"),
+            self.sections["matcher.postings"].cast("I"),
+        )
+
+    def suggestions(self) -> Sequence[str]:
+        if "suggestions.offsets" not in self.sections:
+            return super().suggestions()
+        return self._column("suggestions")
+
+    def typeahead(self) -> Optional[Typeahead]:
+        if "typeahead.answer_ids" not in self.sections:
+            return None
+        return Typeahead(
+            self._column("suggestions"),
+            self._column("typeahead.keys"),
+            self.sections["typeahead.answer_ids"].cast("I"),
+            self.sections["typeahead.card_answers"].cast("I"),
+        )
+
+    def nbytes(self) -> int:
+        # Everything is read from the mapped file, which the OS pages in and out as needed
+        return len(self._mmap)
+
+    def row_hashes(self) -> Optional[List[bytes]]:
+        if "rows.hashes" not in self.sections:
+            return None
+        hashes = self.sections["rows.hashes"]
+        return [bytes(hashes[i : i + ROW_HASH_SIZE]) for i in range(0, len(hashes), ROW_HASH_SIZE)]
+
+    def tag_bits(self) -> MappedTagBits:
+        return MappedTagBits(self.tag_vocabulary, self.sections["tags.bits"], (len(self) + 7) // 8)
+
+
+def open_deck(path: Union[str, os.PathLike]) -> MappedDeck:
+    return MappedDeck(path)
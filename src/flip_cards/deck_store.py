@@ -0,0 +1,278 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+
+from flip_cards import instrumentation
+from flip_cards.deck import Deck
+from flip_cards.index import QuestionIndex
+from flip_cards.matching import AnswerMatcher
+from flip_cards.typeahead import Typeahead
+
+DEFAULT_DECK_ID = "default"
+
+FileStat = Tuple[int, int]  # Modification time in ns and size of a deck file
+
+
+def file_stat(path: Optional[str]) -> Optional[FileStat]:
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SharedDeck:
+    """Immutable deck shared by all sessions of the process"""
+
+    def __init__(
+        self,
+        deck_id: str,
+        version: int,
+        question_objects: Sequence[Mapping],
+        correct_answers: Sequence[str],
+    ):
+        assert len(question_objects) == len(correct_answers)
+        self.deck_id = deck_id
+        self.version = version
+        if isinstance(question_objects, Deck):
+            self.deck = question_objects
+        else:
+            self.deck = Deck.from_question_objects(question_objects, correct_answers)
+        self.index = QuestionIndex.from_deck(self.deck)
+        self.all_tags: FrozenSet[str] = frozenset(self.deck.tag_vocabulary)
+        # Built with the deck, so the first graded answer does not wait for the trigram index
+        self.matcher = AnswerMatcher(
+            self.deck.answer_keys(),
+            self.deck.extra_columns.get("aliases"),
+            self.deck.trigram_index(),
+        )
+        # Of the deck file when loading started, so changes made while loading are seen
+        self.source_stat: Optional[FileStat] = None
+        self._card_index: Optional[Dict[Tuple[str, str], int]] = None
+        self._content_id: Optional[str] = None
+        self._typeahead: Optional[Typeahead] = None
+
+    @property
+    def question_objects(self) -> Deck:
+        return self.deck
+
+    @property
+    def correct_answers(self) -> Sequence[str]:
+        return self.deck.answers
+
+    @property
+    def card_index(self) -> Dict[Tuple[str, str], int]:
+        """Index of the cards by question and answer, to find cards again in a newer version"""
+        if self._card_index is None:
+            deck = self.deck
+            self._card_index = {
+                (deck.question(i), deck.answer(i)): i for i in reversed(range(len(deck)))
+            }
+        return self._card_index
+
+    @property
+    def content_id(self) -> str:
+        """Hash of the questions and answers in order, unlike version the same across restarts
+
+        Saved progress refers to cards by index, so it only fits a deck with the same content id.
+        """
+        if self._content_id is None:
+            import hashlib
+
+            content = hashlib.blake2b(digest_size=16)
+            content.update("\x00".join(self.deck.questions).encode("utf-8"))
+            content.update(b"\x01")
+            content.update("\x00".join(self.deck.answers).encode("utf-8"))
+            self._content_id = content.hexdigest()
+        return self._content_id
+
+    @property
+    def typeahead(self) -> Typeahead:
+        if self._typeahead is None:
+            # Read from the deck file when it has one, building it takes seconds for large decks
+            self._typeahead = self.deck.typeahead() or Typeahead.build(self.deck.answers)
+        return self._typeahead
+
+    def nbytes(self) -> int:
+        """Estimate of the memory held by the deck, its index and matcher, without lazy structures"""
+        return self.deck.nbytes() + self.index.nbytes() + self.matcher.nbytes()
+
+    def __len__(self) -> int:
+        return len(self.deck)
+
+
+class DeckStoreStats:
+    __slots__ = ("hits", "misses", "evictions", "n_decks", "n_bytes")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.n_decks = 0
+        self.n_bytes = 0
+
+    def dict(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class DeckStore:
+    """Process-wide registry of shared decks, keyed by deck id
+
+    Decks are loaded on first use. The least recently used decks are evicted when the loaded
+    decks together exceed max_bytes, and decks that were not used for ttl seconds are evicted
+    on the next access. Sessions that still use an evicted deck keep it alive until they load
+    it again. A deck that is loaded again gets a new version, since its file may have changed.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = DeckStoreStats()
+        # In order of last use, with the time of last use
+        self._decks: "OrderedDict[str, Tuple[SharedDeck, float]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._versions: Dict[str, int] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, deck_id: str) -> bool:
+        return deck_id in self._decks
+
+    def _touch(self, deck_id: str) -> Optional[SharedDeck]:
+        entry = self._decks.get(deck_id)
+        if entry is None:
+            return None
+        self._decks[deck_id] = (entry[0], time.monotonic())
+        self._decks.move_to_end(deck_id)
+        return entry[0]
+
+    def peek(self, deck_id: str) -> Optional[SharedDeck]:
+        """The loaded deck, without counting it as used"""
+        entry = self._decks.get(deck_id)
+        return entry[0] if entry is not None else None
+
+    def loaded(self) -> List[SharedDeck]:
+        with self._lock:
+            return [deck for deck, _ in self._decks.values()]
+
+    def get(self, deck_id: str) -> SharedDeck:
+        with self._lock:
+            deck = self._touch(deck_id)
+        if deck is None:
+            raise KeyError(deck_id)
+        return deck
+
+    def _build(
+        self,
+        deck_id: str,
+        question_objects: Sequence[Mapping],
+        correct_answers: Sequence[str],
+        source_stat: Optional[FileStat],
+    ) -> Tuple[SharedDeck, int]:
+        # Without the lock, building the index and matcher of a large deck takes seconds. The
+        # version is assigned when the deck is added.
+        deck = SharedDeck(deck_id, 0, question_objects, correct_answers)
+        deck.source_stat = source_stat
+        return deck, deck.nbytes() if self.max_bytes is not None else 0
+
+    def _add(self, deck: SharedDeck, n_bytes: int):
+        # Called with the lock held
+        deck.version = self._versions.get(deck.deck_id, 0) + 1
+        if deck.deck_id in self._decks:
+            self.stats.n_bytes -= self._sizes[deck.deck_id]
+        self._decks[deck.deck_id] = (deck, time.monotonic())
+        self._decks.move_to_end(deck.deck_id)
+        self._sizes[deck.deck_id] = n_bytes
+        self._versions[deck.deck_id] = deck.version
+        self.stats.n_bytes += n_bytes
+        self._evict(keep=deck.deck_id)
+
+    def _remove(self, deck_id: str):
+        del self._decks[deck_id]
+        self.stats.n_bytes -= self._sizes.pop(deck_id)
+        self.stats.evictions += 1
+
+    def _evict(self, keep: Optional[str] = None):
+        # Called with the lock held. Oldest first, so expired decks are at the front
+        if self.ttl is not None:
+            expired_before = time.monotonic() - self.ttl
+            for deck_id, (_, last_used) in list(self._decks.items()):
+                if last_used >= expired_before:
+                    break
+                if deck_id != keep:
+                    self._remove(deck_id)
+        if self.max_bytes is not None:
+            for deck_id in list(self._decks):
+                if self.stats.n_bytes <= self.max_bytes:
+                    break
+                if deck_id != keep:
+                    self._remove(deck_id)
+        self.stats.n_decks = len(self._decks)
+
+    def register(
+        self,
+        deck_id: str,
+        question_objects: Sequence[Mapping],
+        correct_answers: Sequence[str],
+        source_stat: Optional[FileStat] = None,
+    ) -> SharedDeck:
+        deck, n_bytes = self._build(deck_id, question_objects, correct_answers, source_stat)
+        with self._lock:
+            self._add(deck, n_bytes)
+        return deck
+
+    def replace(
+        self,
+        deck_id: str,
+        question_objects: Sequence[Mapping],
+        correct_answers: Sequence[str],
+        source_stat: Optional[FileStat] = None,
+    ) -> Optional[SharedDeck]:
+        """Registers a new version of a loaded deck, None when the deck was evicted meanwhile"""
+        deck, n_bytes = self._build(deck_id, question_objects, correct_answers, source_stat)
+        with self._lock:
+            if deck_id not in self._decks:
+                return None
+            self._add(deck, n_bytes)
+        return deck
+
+    def get_or_load(
+        self,
+        deck_id: str,
+        load: Callable[[], Tuple[Sequence[Mapping], Sequence[str]]],
+        stat: Optional[Callable[[], Optional[FileStat]]] = None,
+    ) -> SharedDeck:
+        """The loaded deck, or the deck that load() returns
+
+        stat() is called before load(), the deck keeps the result as its source_stat.
+        """
+        with self._lock:
+            self._evict()
+            deck = self._touch(deck_id)
+            if deck is not None:
+                self.stats.hits += 1
+                instrumentation.count("deck_cache_hit")
+                return deck
+            load_lock = self._load_locks.setdefault(deck_id, threading.Lock())
+
+        # Decks are loaded one at a time per deck, other decks stay available meanwhile
+        with load_lock:
+            with self._lock:
+                # Another session may have loaded the deck while we were waiting for the lock
+                deck = self._touch(deck_id)
+                if deck is not None:
+                    self.stats.hits += 1
+                    instrumentation.count("deck_cache_hit")
+                    return deck
+                self.stats.misses += 1
+            instrumentation.count("deck_cache_miss")
+            source_stat = stat() if stat is not None else None
+            question_objects, correct_answers = load()
+            deck, n_bytes = self._build(deck_id, question_objects, correct_answers, source_stat)
+            with self._lock:
+                self._add(deck, n_bytes)
+            return deck
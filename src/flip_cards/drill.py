@@ -0,0 +1,97 @@
+"""Overhoringen in the terminal, interactively or scripted for load generation"""
+
+import random
+import time
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, TextIO
+
+from flip_cards.engine import QuizSession
+
+if TYPE_CHECKING:
+    from flip_cards.progress_store import ProgressStore
+
+# Given the question index, returns the answer, or None to stop the session
+Answerer = Callable[[int], Optional[str]]
+
+
+class DrillStats:
+    __slots__ = ("sessions", "answers", "correct", "seconds")
+
+    def __init__(self):
+        self.sessions = 0
+        self.answers = 0
+        self.correct = 0
+        self.seconds = 0.0
+
+    @property
+    def answers_per_second(self) -> float:
+        return self.answers / self.seconds if self.seconds else float("inf")
+
+
+def scripted_answers(lines: Iterator[str]) -> Answerer:
+    def _answer(question_index: int) -> Optional[str]:
+        return next(lines, None)
+
+    return _answer
+
+
+def simulated_answers(
+    session: QuizSession, accuracy: float, seed: Optional[int] = None
+) -> Answerer:
+    rng = random.Random(seed)
+
+    def _answer(question_index: int) -> Optional[str]:
+        if rng.random() < accuracy:
+            return session.deck.correct_answers[question_index]
+        return "?"
+
+    return _answer
+
+
+def run_session(
+    session: QuizSession,
+    answer: Answerer,
+    stats: DrillStats,
+    output: Optional[TextIO] = None,
+    max_answers: Optional[int] = None,
+    progress_store: Optional["ProgressStore"] = None,
+    user_id: str = "drill",
+):
+    deck = session.deck
+    if progress_store is not None:
+        progress_store.save_progress(
+            user_id, deck.deck_id, {"deck_content": deck.content_id, **session.base_snapshot()}
+        )
+    start = time.perf_counter()
+    n_answers = 0
+    while not session.finished and (max_answers is None or n_answers < max_answers):
+        question_index = session.current
+        if output is not None:
+            progress = session.progress()
+            print(f"\n[{progress.n_done}/{progress.n_total}]", file=output)
+            print(deck.deck.question(question_index), file=output)
+        given_answer = answer(question_index)
+        if given_answer is None:
+            break
+        correct = session.answer(given_answer)
+        n_answers += 1
+        stats.correct += correct
+        if progress_store is not None:
+            progress_store.record_answer(user_id, deck.deck_id, question_index, correct)
+            progress_store.save_step(user_id, deck.deck_id, question_index, correct)
+        if output is not None:
+            if correct:
+                print("Correct!", file=output)
+            else:
+                print(f"Wrong, it is: {deck.correct_answers[question_index]}", file=output)
+            info = deck.deck.info(question_index)
+            if info:
+                print(info, file=output)
+        session.advance()
+
+    stats.sessions += 1
+    stats.answers += n_answers
+    stats.seconds += time.perf_counter() - start
+    if output is not None:
+        progress = session.progress()
+        correct_msg = f"{progress.correct_fraction:.0%} ({progress.n_correct}/{progress.n_graded})"
+        print(f"\nCorrect: {correct_msg}", file=output)
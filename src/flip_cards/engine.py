@@ -0,0 +1,237 @@
+"""The overhoring itself, without Streamlit: question selection, scheduling, grading and stats
+
+The app keeps a QuizSession in its session state and only adds widgets around it. The
+`flip-cards drill` command runs the same sessions in a terminal.
+"""
+
+import random
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from flip_cards.deck_store import SharedDeck
+from flip_cards.index import QuestionIndex, filter_question_indices
+from flip_cards.scheduler import INFINITE_PRACTICE_LENGTH, LeitnerPolicy, Scheduler
+from flip_cards.stats import CardStats
+
+QuizConfig = Dict  # As returned by Config().dict()
+
+SNAPSHOT_KEYS = ["config", "n_questions", "question_indices", "queue", "card_stats", "n_correct"]
+
+
+class QuizError(ValueError):
+    pass
+
+
+def filter_key(config: QuizConfig) -> Tuple[FrozenSet[str], ...]:
+    # Normalized, hashable snapshot of the config fields that determine the possible questions
+    return (
+        frozenset(config["selected_questions"]),
+        frozenset(config["included_tags"]),
+        frozenset(config["excluded_tags"]),
+    )
+
+
+def possible_question_indices(index: QuestionIndex, config: QuizConfig) -> Tuple[int, ...]:
+    return filter_question_indices(index, *filter_key(config))
+
+
+def n_questions_selected(config: QuizConfig) -> int:
+    if config["random_selection"]:
+        return config["n_random_questions"]
+    return config["question_end_index"] - config["question_start_index"]
+
+
+def select_questions(index: QuestionIndex, config: QuizConfig, rng: random.Random) -> List[int]:
+    possible_indices = possible_question_indices(index, config)
+    if not possible_indices:
+        raise QuizError("No questions match the filters")
+    if not config["random_selection"]:
+        start_index = config["question_start_index"]
+        end_index = config["question_end_index"]
+        if end_index > len(possible_indices):
+            raise QuizError(f"Only {len(possible_indices)} questions match the filters")
+        return list(possible_indices[start_index:end_index])
+    n_random_questions = config["n_random_questions"]
+    if n_random_questions > len(possible_indices):
+        raise QuizError(f"Only {len(possible_indices)} questions match the filters")
+    return rng.sample(possible_indices, n_random_questions)
+
+
+class Progress(NamedTuple):
+    n_done: int
+    n_total: int
+    n_correct: int
+    n_graded: int  # Questions, or attempts when practicing infinitely, that n_correct is out of
+
+    @property
+    def done_fraction(self) -> float:
+        return self.n_done / self.n_total if self.n_total else 1.0
+
+    @property
+    def correct_fraction(self) -> float:
+        return self.n_correct / self.n_graded if self.n_graded else 0.0
+
+
+class QuizSession:
+    """One overhoring over a shared deck
+
+    The deck is not part of the state that is pickled or snapshotted, it is shared between
+    sessions and attached again with from_snapshot() or replay().
+    """
+
+    def __init__(self, deck: SharedDeck, config: QuizConfig, seed: Optional[int] = None):
+        if seed is None:
+            seed = random.getrandbits(32)
+        rng = random.Random(seed)
+        # Recreates the same session on the same deck, until it is remapped
+        self.seed: Optional[int] = seed
+        self.deck = deck
+        self.config = dict(config)
+        self.question_indices = select_questions(deck.index, self.config, rng)
+        self.n_questions = n_questions_selected(self.config)
+        infinite_practice = self.config["infinite_practice"]
+        self.queue = Scheduler(
+            self.question_indices,
+            LeitnerPolicy(retire_correct=not infinite_practice),
+            length=INFINITE_PRACTICE_LENGTH if infinite_practice else None,
+            seed=rng.getrandbits(32),
+        )
+        self.card_stats = CardStats(self.question_indices)
+        self.n_correct = 0
+
+    @property
+    def finished(self) -> bool:
+        return not self.queue
+
+    @property
+    def current(self) -> int:
+        return self.queue.current
+
+    @property
+    def answered(self) -> bool:
+        return self.queue.answered
+
+    def grade(self, given_answer: str) -> bool:
+        """Checks the answer to the current question and counts it in the stats"""
+        question_index = self.current
+        correct = self.deck.matcher.is_correct(
+            given_answer, question_index, self.config["answer_tolerance"]
+        )
+        self._count(question_index, correct)
+        return correct
+
+    def _count(self, question_index: int, correct: bool):
+        # Without infinite practice, only the first answer to a question counts
+        first_answer = not self.card_stats.is_seen(question_index)
+        if correct and (self.config["infinite_practice"] or first_answer):
+            self.n_correct += 1
+        self.card_stats.record(question_index, correct)
+
+    def reschedule(self, correct: bool):
+        self.queue.reschedule(self.current, correct)
+
+    def answer(self, given_answer: str) -> bool:
+        correct = self.grade(given_answer)
+        self.reschedule(correct)
+        return correct
+
+    def advance(self) -> int:
+        return self.queue.advance()
+
+    def remap(self, deck: SharedDeck):
+        """Moves the session to a new version of its deck
+
+        Cards are matched by question and answer. Cards that were removed are dropped from the
+        overhoring, cards that were added are not part of it.
+        """
+        card_index = deck.card_index
+        old_deck = self.deck.deck
+        mapping: Dict[int, int] = {}
+        mapped: Set[int] = set()
+        for i in self.question_indices:
+            j = card_index.get((old_deck.question(i), old_deck.answer(i)))
+            if j is not None and j not in mapped:
+                mapping[i] = j
+                mapped.add(j)
+
+        card_stats = self.card_stats
+        infinite_practice = self.config["infinite_practice"]
+        for i in self.question_indices:
+            if i in mapping or not card_stats.is_seen(i):
+                continue
+            # Take the answers to the dropped question out of the score, as grade() counted them
+            if infinite_practice:
+                self.n_correct -= card_stats.n_correct_of(i)
+            elif card_stats.n_correct_of(i) == card_stats.n_attempts_of(i):
+                # A correct answer retires the question, so its only answer was the first one
+                self.n_correct -= 1
+
+        self.deck = deck
+        self.question_indices = [mapping[i] for i in self.question_indices if i in mapping]
+        if not infinite_practice:
+            self.n_questions -= card_stats.n_questions - len(mapping)
+        self.queue.remap(mapping)
+        self.card_stats.remap(mapping)
+        self.seed = None
+
+    def progress(self) -> Progress:
+        card_stats = self.card_stats
+        if self.config["infinite_practice"]:
+            n_total = INFINITE_PRACTICE_LENGTH
+            n_left = len(self.queue) - 1 if self.answered else len(self.queue)
+            n_graded = card_stats.n_attempts
+        else:
+            n_total = self.n_questions
+            n_left = card_stats.n_questions - card_stats.n_seen
+            n_graded = card_stats.n_seen
+        return Progress(n_total - n_left, n_total, self.n_correct, n_graded)
+
+    def to_snapshot(self) -> Dict:
+        return {key: getattr(self, key) for key in SNAPSHOT_KEYS}
+
+    def base_snapshot(self) -> Dict:
+        """Snapshot to replay() the answers given after it on
+
+        A new session is recreated from its config and seed, which keeps the snapshot small.
+        """
+        if self.seed is not None and not self.queue.step and not self.answered:
+            return {"config": self.config, "seed": self.seed}
+        return self.to_snapshot()
+
+    @classmethod
+    def from_snapshot(cls, deck: SharedDeck, snapshot: Dict) -> "QuizSession":
+        session = cls.__new__(cls)
+        session.deck = deck
+        session.seed = None
+        for key in SNAPSHOT_KEYS:
+            setattr(session, key, snapshot[key])
+        return session
+
+    @classmethod
+    def replay(
+        cls, deck: SharedDeck, snapshot: Dict, steps: Iterable[Tuple[int, bool]]
+    ) -> "QuizSession":
+        """Recreates a session from a base snapshot and the answers given since, in order
+
+        Each answer is a question index and whether it was correct. The last one is answered,
+        but not advanced yet.
+        """
+        if "seed" in snapshot:
+            session = cls(deck, snapshot["config"], seed=snapshot["seed"])
+        else:
+            session = cls.from_snapshot(deck, snapshot)
+        for question_index, correct in steps:
+            if session.answered:
+                session.advance()
+            if session.finished or session.current != question_index:
+                raise QuizError("The answers do not follow from the snapshot")
+            session._count(question_index, correct)
+            session.reschedule(correct)
+        return session
+
+    def __getstate__(self) -> Dict:
+        return {"seed": self.seed, **self.to_snapshot()}
+
+    def __setstate__(self, state: Dict):
+        self.deck = None
+        self.seed = None
+        self.__dict__.update(state)
@@ -0,0 +1,88 @@
+"""Reloads decks when their file changes, without restarting the app
+
+A changed deck is registered as a new version in the deck store. Sessions move to the new
+version on their next rerun, see QuizSession.remap().
+"""
+
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from flip_cards import build, deck_format
+from flip_cards.deck import Deck
+from flip_cards.deck_store import DeckStore, FileStat, SharedDeck, file_stat
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 2.0  # Seconds
+
+
+def reload_deck(store: DeckStore, deck_id: str, path: str) -> Optional[SharedDeck]:
+    """Loads the deck file again and registers it as a new version of the deck
+
+    Raw sources are only processed for rows that changed since the loaded version, when that
+    version has the hashes of its rows. Decks that are no longer loaded are skipped, they are
+    read fresh when they are used again. Returns the new version, or None when skipped.
+    """
+    previous = store.peek(deck_id)
+    if previous is None:
+        return None
+    source_stat = file_stat(path)
+    if path.endswith(deck_format.SUFFIX):
+        deck: Deck = deck_format.open_deck(path)
+    else:
+        deck, stats = build.build_deck(path, previous.deck)
+        logger.info("Reloaded %s: %d of %d rows changed", path, stats.processed_rows, stats.rows)
+    return store.replace(deck_id, deck, deck.answers, source_stat)
+
+
+class DeckWatcher:
+    """Polls the files of the loaded decks and reloads those that changed
+
+    Only decks that are loaded are watched, others are read fresh when they are loaded.
+    """
+
+    def __init__(
+        self,
+        store: DeckStore,
+        get_deck_paths: Callable[[], Dict[str, Optional[str]]],
+        interval: float = POLL_INTERVAL,
+    ):
+        self.store = store
+        self.get_deck_paths = get_deck_paths
+        self.interval = interval
+        # The file of a deck that failed to reload, it is tried again when the file changes
+        self._failed: Dict[str, FileStat] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self):
+        deck_paths = self.get_deck_paths()
+        for deck in self.store.loaded():
+            path = deck_paths.get(deck.deck_id)
+            source_stat = file_stat(path)
+            if source_stat is None or source_stat == deck.source_stat:
+                continue
+            if self._failed.get(deck.deck_id) == source_stat:
+                continue
+            try:
+                reload_deck(self.store, deck.deck_id, path)
+            except Exception:
+                # E.g. still being written
+                logger.exception("Could not reload %s", path)
+                self._failed[deck.deck_id] = source_stat
+            else:
+                self._failed.pop(deck.deck_id, None)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="deck-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
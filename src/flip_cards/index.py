@@ -0,0 +1,250 @@
+import sys
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+if TYPE_CHECKING:
+    from flip_cards.deck import Deck
+
+FILTER_CACHE_SIZE = 256
+TAG_BITS_CACHE_SIZE = 64
+
+# Sets of question indices are represented as Python ints used as bitsets: bit i is set when
+# question i is part of the set. Unions, intersections and differences are then single
+# big-int operations instead of per-question Python loops.
+
+
+def bits_from_indices(indices: Iterable[int]) -> int:
+    buffer = bytearray()
+    for i in indices:
+        if i >> 3 >= len(buffer):
+            buffer.extend(bytes((i >> 3) + 1 - len(buffer)))
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def indices_from_bits(bits: int) -> List[int]:
+    # Walk the binary representation from the least significant bit, using str.find to
+    # skip over runs of zeros
+    binary = bin(bits)[:1:-1]
+    indices = []
+    i = binary.find("1")
+    while i != -1:
+        indices.append(i)
+        i = binary.find("1", i + 1)
+    return indices
+
+
+T = TypeVar("T")
+
+
+class FilterCache:
+    """Bounded LRU cache of the filter results of one index
+
+    Kept on the index instead of in a module-level cache, so the results, and the index they
+    refer to, are freed together with the deck.
+    """
+
+    def __init__(self, maxsize: int = FILTER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results: "OrderedDict[Hashable, object]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Hashable, compute: Callable[[], T]) -> T:
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                self._results.move_to_end(key)
+                return self._results[key]  # type: ignore[return-value]
+            self.misses += 1
+        # Computed without the lock, concurrent sessions may compute the same result twice
+        result = compute()
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+class MappedTagBits(Mapping):
+    """Tag -> bitset mapping over the bitsets in the mapped pages of a deck file
+
+    A bitset is only converted to an int when its tag is looked up, and only the most recently
+    used ones are kept. Converting all of them would copy a bit per card per tag into every
+    process that opens the deck.
+    """
+
+    def __init__(
+        self,
+        tags: Sequence[str],
+        bitsets: memoryview,
+        n_bitset_bytes: int,
+        cache_size: int = TAG_BITS_CACHE_SIZE,
+    ):
+        self._codes = {tag: code for code, tag in enumerate(tags)}
+        self._bitsets = bitsets
+        self._n_bitset_bytes = n_bitset_bytes
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _convert(self, code: int) -> int:
+        start = code * self._n_bitset_bytes
+        return int.from_bytes(self._bitsets[start : start + self._n_bitset_bytes], "little")
+
+    def __getitem__(self, tag: str) -> int:
+        with self._lock:
+            if tag in self._cache:
+                self._cache.move_to_end(tag)
+                return self._cache[tag]
+        bits = self._convert(self._codes[tag])
+        with self._lock:
+            self._cache[tag] = bits
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return bits
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._codes)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def items(self) -> Iterator[Tuple[str, int]]:  # type: ignore[override]
+        # Visits every tag once, so the bitsets are converted without evicting the cached ones
+        for tag, code in self._codes.items():
+            yield tag, self._convert(code)
+
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(sys.getsizeof(bits) for bits in self._cache.values())
+
+
+class QuestionIndex:
+    """Inverted tag -> questions and answer -> questions index of a deck"""
+
+    def __init__(
+        self,
+        n_questions: int,
+        tag_bits: "Mapping[str, int]",
+        answers: Sequence[str],
+    ):
+        self.n_questions = n_questions
+        self.all_bits = (1 << n_questions) - 1
+        self.tag_bits = tag_bits
+        self._answers = answers
+        self._answer_bits: Optional[Dict[str, int]] = None
+        self.filter_cache = FilterCache()
+
+    @classmethod
+    def from_deck(cls, deck: "Deck") -> "QuestionIndex":
+        return cls(len(deck), deck.tag_bits(), deck.answers)
+
+    @property
+    def answer_bits(self) -> Dict[str, int]:
+        # Only needed when questions are selected by answer, so built on first use
+        if self._answer_bits is None:
+            answer_indices: Dict[str, List[int]] = {}
+            for i, answer in enumerate(self._answers):
+                answer_indices.setdefault(answer, []).append(i)
+            self._answer_bits = {
+                answer: bits_from_indices(indices) for answer, indices in answer_indices.items()
+            }
+        return self._answer_bits
+
+    @property
+    def tags(self) -> List[str]:
+        return list(self.tag_bits)
+
+    def bits_with_any_tag(self, tags: Iterable[str]) -> int:
+        bits = 0
+        for tag in tags:
+            bits |= self.tag_bits.get(tag, 0)
+        return bits
+
+    def bits_with_any_answer(self, answers: Iterable[str]) -> int:
+        bits = 0
+        for answer in answers:
+            bits |= self.answer_bits.get(answer, 0)
+        return bits
+
+    def tags_in_bits(self, bits: int) -> List[str]:
+        if bits == self.all_bits:
+            return self.tags  # Every tag in the vocabulary is on at least one card
+        return [tag for tag, tag_bits in self.tag_bits.items() if tag_bits & bits]
+
+    def nbytes(self) -> int:
+        if isinstance(self.tag_bits, MappedTagBits):
+            return self.tag_bits.nbytes()
+        return sum(sys.getsizeof(bits) for bits in self.tag_bits.values())
+
+
+def _filter_question_bits(
+    question_index: QuestionIndex,
+    selected_questions: FrozenSet[str],
+    included_tags: FrozenSet[str],
+    excluded_tags: FrozenSet[str],
+) -> int:
+    bits = question_index.all_bits
+    if selected_questions:
+        bits &= question_index.bits_with_any_answer(selected_questions)
+    if included_tags:
+        bits &= question_index.bits_with_any_tag(included_tags)
+    if excluded_tags:
+        bits &= ~question_index.bits_with_any_tag(excluded_tags)
+    return bits
+
+
+def filter_question_bits(
+    question_index: QuestionIndex,
+    selected_questions: FrozenSet[str],
+    included_tags: FrozenSet[str],
+    excluded_tags: FrozenSet[str],
+) -> int:
+    return question_index.filter_cache.get(
+        ("bits", selected_questions, included_tags, excluded_tags),
+        lambda: _filter_question_bits(
+            question_index, selected_questions, included_tags, excluded_tags
+        ),
+    )
+
+
+def filter_question_indices(
+    question_index: QuestionIndex,
+    selected_questions: FrozenSet[str],
+    included_tags: FrozenSet[str],
+    excluded_tags: FrozenSet[str],
+) -> Tuple[int, ...]:
+    # Returned as a tuple, since the result is shared between all callers of the cache
+    def _compute() -> Tuple[int, ...]:
+        bits = filter_question_bits(
+            question_index, selected_questions, included_tags, excluded_tags
+        )
+        return tuple(indices_from_bits(bits))
+
+    return question_index.filter_cache.get(
+        ("indices", selected_questions, included_tags, excluded_tags), _compute
+    )
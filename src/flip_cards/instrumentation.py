@@ -0,0 +1,226 @@
+"""Per-stage timing and event counters of the app, exported to a metrics file
+
+Enabled by setting METRICS_PATH. The file is rewritten every METRICS_INTERVAL seconds, as
+JSON when the path ends with .json and in the Prometheus text format otherwise. When
+disabled, stage() hands out a shared no-op context manager.
+"""
+
+import contextlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, ContextManager, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_NULL_CONTEXT = contextlib.nullcontext()
+_UNSET = object()
+
+SESSION_STATE_SAMPLE_EVERY = 20  # Reruns of a session
+SESSION_SIZE_TTL = 3600.0  # Seconds after the last sample that a session is still counted
+MAX_SESSIONS = 10000
+_SAMPLE_KEY = "_session_state_sample"
+
+
+class StageStats:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+
+class Metrics:
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.stages: Dict[str, StageStats] = {}
+        self.events: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        self.gauge_callbacks: Dict[str, Callable[[], Dict[str, float]]] = {}
+        # Session -> size of its state and when it was sampled, in order of sampling
+        self.session_sizes: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._exporter = threading.Thread(target=self._export_loop, name="metrics", daemon=True)
+        self._exporter.start()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            # Also reached through st.stop() and st.rerun(), which raise
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.stages.setdefault(name, StageStats()).add(seconds)
+
+    def count(self, event: str, n: int = 1):
+        with self._lock:
+            self.events[event] = self.events.get(event, 0) + n
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+            self.gauges[f"{name}_max"] = max(value, self.gauges.get(f"{name}_max", value))
+
+    def set_session_size(self, session: str, n_bytes: int):
+        with self._lock:
+            self.session_sizes[session] = (n_bytes, time.monotonic())
+            self.session_sizes.move_to_end(session)
+            if len(self.session_sizes) > MAX_SESSIONS:
+                self.session_sizes.popitem(last=False)
+
+    def _session_size_gauges(self) -> Dict[str, float]:
+        # Called with the lock held. Oldest first, so sessions that ended are at the front
+        expired_before = time.monotonic() - SESSION_SIZE_TTL
+        while self.session_sizes and next(iter(self.session_sizes.values()))[1] < expired_before:
+            self.session_sizes.popitem(last=False)
+        sizes = sorted(n_bytes for n_bytes, _ in self.session_sizes.values())
+        if not sizes:
+            return {}
+        return {
+            "session_state_sessions": len(sizes),
+            "session_state_bytes_p50": sizes[(len(sizes) - 1) // 2],
+            "session_state_bytes_p90": sizes[(len(sizes) - 1) * 9 // 10],
+            "session_state_bytes_max": sizes[-1],
+        }
+
+    def snapshot(self) -> Dict:
+        gauges = {}
+        for prefix, callback in list(self.gauge_callbacks.items()):
+            for name, value in callback().items():
+                gauges[f"{prefix}_{name}"] = value
+        with self._lock:
+            gauges.update(self.gauges)
+            gauges.update(self._session_size_gauges())
+            return {
+                "stages": {
+                    name: {"count": s.count, "total_seconds": s.total, "max_seconds": s.max}
+                    for name, s in self.stages.items()
+                },
+                "events": dict(self.events),
+                "gauges": gauges,
+            }
+
+    def export(self):
+        snapshot = self.snapshot()
+        if self.path.endswith(".json"):
+            import json
+
+            text = json.dumps(snapshot, indent=2)
+        else:
+            text = _to_prometheus_text(snapshot)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+
+    def _export_loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.export()
+            except Exception:
+                import logging
+
+                logging.getLogger(__name__).exception("Failed to export metrics to %s", self.path)
+
+
+def _to_prometheus_text(snapshot: Dict) -> str:
+    stages = snapshot["stages"]
+    lines: List[str] = ["# TYPE flip_cards_stage_seconds summary"]
+    for name, s in stages.items():
+        lines.append(f'flip_cards_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+        lines.append(f'flip_cards_stage_seconds_sum{{stage="{name}"}} {s["total_seconds"]}')
+    lines.append("# TYPE flip_cards_stage_seconds_max gauge")
+    for name, s in stages.items():
+        lines.append(f'flip_cards_stage_seconds_max{{stage="{name}"}} {s["max_seconds"]}')
+    lines.append("# TYPE flip_cards_events_total counter")
+    for name, n in snapshot["events"].items():
+        lines.append(f'flip_cards_events_total{{event="{name}"}} {n}')
+    for name, value in snapshot["gauges"].items():
+        lines.append(f"# TYPE flip_cards_{name} gauge")
+        lines.append(f"flip_cards_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_metrics = _UNSET
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Optional[Metrics]:
+    # Read from the environment on first use, so after dotenv.load_dotenv() in the app
+    global _metrics
+    if _metrics is _UNSET:
+        with _metrics_lock:
+            if _metrics is _UNSET:
+                path = os.getenv("METRICS_PATH")
+                interval = float(os.getenv("METRICS_INTERVAL", "10"))
+                _metrics = Metrics(path, interval) if path else None
+    return _metrics
+
+
+def stage(name: str) -> ContextManager[None]:
+    metrics = get_metrics()
+    return _NULL_CONTEXT if metrics is None else metrics.stage(name)
+
+
+def count(event: str, n: int = 1):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.count(event, n)
+
+
+def register_gauges(prefix: str, callback: Callable[[], Dict[str, float]]):
+    """Registers a callback that is asked for the current gauge values on every export"""
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.gauge_callbacks[prefix] = callback
+
+
+def set_gauge(name: str, value: float):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.set_gauge(name, value)
+
+
+def record_session_state_size(session_state, shared_keys: Iterable[str] = ()):
+    """Pickled size of the session state, without the values under shared_keys
+
+    Those values refer to data that is shared between sessions, like the deck, which would be
+    pickled along and counted as memory of every session. Values with an nbytes() method are
+    not pickled, but report their own size. Pickling the whole state takes time, so a session
+    is only measured every SESSION_STATE_SAMPLE_EVERY reruns. The export has percentiles over
+    the last size of every session.
+    """
+    metrics = get_metrics()
+    if metrics is None:
+        return
+    sample = session_state.get(_SAMPLE_KEY)
+    if sample is None:
+        sample = session_state[_SAMPLE_KEY] = [uuid.uuid4().hex, 0]
+    sample[1] += 1
+    if (sample[1] - 1) % SESSION_STATE_SAMPLE_EVERY:
+        return
+    import pickle
+
+    size = 0
+    skipped = {*shared_keys, _SAMPLE_KEY}
+    for key, value in dict(session_state).items():
+        if key in skipped:
+            continue
+        if callable(getattr(value, "nbytes", None)):
+            size += value.nbytes()
+            continue
+        try:
+            size += len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:  # Not everything in the session state can be pickled
+            continue
+    metrics.set_session_size(sample[0], size)
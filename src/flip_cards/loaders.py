@@ -0,0 +1,165 @@
+import csv
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from flip_cards.deck import Deck, DeckBuilder
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 10000
+TAG_SEPARATOR = ";"
+
+Row = Dict[str, object]
+RowReader = Callable[[Path, int], Iterator[List[Row]]]
+
+_ROW_READERS: Dict[str, RowReader] = {}
+
+
+class DeckLoadError(ValueError):
+    pass
+
+
+@dataclass
+class LoadStats:
+    rows: int
+    seconds: float
+    peak_memory_bytes: Optional[int]
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float("inf")
+
+
+def register_reader(*suffixes: str) -> Callable[[RowReader], RowReader]:
+    """Registers a chunked row reader for files with the given suffixes"""
+
+    def _register(reader: RowReader) -> RowReader:
+        for suffix in suffixes:
+            _ROW_READERS[suffix.lower()] = reader
+        return reader
+
+    return _register
+
+
+def supported_suffixes() -> List[str]:
+    return sorted(_ROW_READERS)
+
+
+def _chunked(rows: Iterable[Row], chunk_size: int) -> Iterator[List[Row]]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+@register_reader(".csv")
+def read_csv_chunks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Row]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        yield from _chunked(csv.DictReader(f), chunk_size)
+
+
+def _parse_jsonl(lines: Iterable[str]) -> Iterator[Row]:
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise DeckLoadError(f"Line {line_number}: invalid JSON, {e.msg}") from None
+
+
+@register_reader(".jsonl", ".ndjson")
+def read_jsonl_chunks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Row]]:
+    with open(path, encoding="utf-8") as f:
+        yield from _chunked(_parse_jsonl(f), chunk_size)
+
+
+@register_reader(".parquet")
+def read_parquet_chunks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Row]]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Loading Parquet decks requires pyarrow (`uv add pyarrow`)") from e
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        yield batch.to_pylist()
+
+
+def iter_row_chunks(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> Iterator[List[Row]]:
+    path = Path(path)
+    try:
+        reader = _ROW_READERS[path.suffix.lower()]
+    except KeyError:
+        raise DeckLoadError(
+            f"No reader for '{path.suffix}' files, expected one of {sorted(_ROW_READERS)}"
+        ) from None
+    return reader(path, chunk_size)
+
+
+def _normalize_tags(tags) -> Tuple[str, ...]:
+    if tags is None:
+        return ()
+    if isinstance(tags, str):
+        tags = tags.split(TAG_SEPARATOR)
+    return tuple(tag.strip() for tag in tags if tag and tag.strip())
+
+
+def normalize_row(row: Row, row_number: int) -> Row:
+    """Validates a raw row and returns it with the fields expected by DeckBuilder.add"""
+    if not isinstance(row, dict):
+        raise DeckLoadError(f"Row {row_number}: expected an object, got {type(row).__name__}")
+    if None in row:
+        # Where csv.DictReader puts the values of fields that have no column in the header
+        raise DeckLoadError(f"Row {row_number}: more fields than columns in the header")
+    question = row.get("question")
+    answer = row.get("answer")
+    for field, value in (("question", question), ("answer", answer)):
+        if not isinstance(value, str) or not value.strip():
+            raise DeckLoadError(f"Row {row_number}: missing or empty '{field}'")
+
+    info = row.get("info") or ""
+    if not isinstance(info, str):
+        raise DeckLoadError(f"Row {row_number}: 'info' must be text")
+
+    normalized = {k: v for k, v in row.items() if k not in ("question", "answer", "info", "tags")}
+    normalized["question"] = question.strip()
+    normalized["answer"] = " ".join(answer.split())
+    normalized["info"] = info.strip()
+    normalized["tags"] = _normalize_tags(row.get("tags"))
+    return normalized
+
+
+def _peak_memory_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def load_deck(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> Tuple[Deck, LoadStats]:
+    """Streams a CSV, JSONL or Parquet deck into a Deck, chunk by chunk"""
+    start = time.perf_counter()
+    builder = DeckBuilder()
+    for chunk in iter_row_chunks(path, chunk_size):
+        for row in chunk:
+            builder.add(**normalize_row(row, len(builder) + 1))
+
+    if not len(builder):
+        raise DeckLoadError(f"No cards found in {path}")
+
+    stats = LoadStats(len(builder), time.perf_counter() - start, _peak_memory_bytes())
+    logger.info(
+        "Loaded %d cards from %s (%.0f rows/s, peak memory %s bytes)",
+        stats.rows,
+        path,
+        stats.rows_per_second,
+        stats.peak_memory_bytes,
+    )
+    return builder.build(), stats
@@ -0,0 +1,264 @@
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from itertools import takewhile
+from operator import eq
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+ALIAS_SEPARATOR = ";"
+
+
+def normalize_answer(answer: str) -> str:
+    """Casefolded answer without diacritics and with collapsed whitespace"""
+    decomposed = unicodedata.normalize("NFKD", answer)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance between a and b, or max_distance + 1 if it exceeds max_distance"""
+    too_far = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return too_far
+    # A common prefix or suffix does not change the distance, and answer keys of one deck
+    # often share a long prefix
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return min(len(b), too_far)
+
+    # Cells further than max_distance from the diagonal cannot be within max_distance
+    previous = [min(j, too_far) for j in range(len(a) + 1)]
+    for i, char_b in enumerate(b, 1):
+        low = max(1, i - max_distance)
+        high = min(len(a), i + max_distance)
+        current = [too_far] * (len(a) + 1)
+        current[0] = min(i, too_far)
+        for j in range(low, high + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[j - 1] != char_b),
+                too_far,
+            )
+        if min(current[low - 1 : high + 1]) > max_distance:
+            return too_far
+        previous = current
+    return previous[-1]
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Whether the Levenshtein distance between a and b is at most 1
+
+    Same result as edit_distance(a, b, 1) <= 1, with the characters compared in C loops, which
+    is several times faster when many candidates share a prefix with the given answer.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if len(b) - len(a) > 1:
+        return False
+    start = sum(takewhile(bool, map(eq, a, b)))  # Length of the common prefix
+    if len(a) == len(b):
+        return a[start + 1 :] == b[start + 1 :]
+    return a[start:] == b[start + 1 :]
+
+
+def _trigrams(key: str) -> Set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _parse_aliases(aliases) -> Tuple[str, ...]:
+    if not aliases:
+        return ()
+    if isinstance(aliases, str):
+        aliases = aliases.split(ALIAS_SEPARATOR)
+    return tuple(normalize_answer(alias) for alias in aliases if alias and alias.strip())
+
+
+def all_keys(answer_keys: Iterable[str], aliases: Optional[Iterable] = None) -> Iterator[str]:
+    """The answer keys followed by the normalized aliases of all cards"""
+    yield from answer_keys
+    if aliases is not None:
+        for card_aliases in aliases:
+            yield from _parse_aliases(card_aliases)
+
+
+def _nbytes(columns: Iterable[Sequence]) -> int:
+    # Lists and arrays in memory, counting shared strings once. Columns read from a mapped
+    # deck are counted with its file.
+    strings = {}
+    n_bytes = 0
+    for column in columns:
+        if isinstance(column, (list, array)):
+            n_bytes += sys.getsizeof(column)
+        if isinstance(column, list):
+            strings.update((id(s), s) for s in column)
+    return n_bytes + sum(sys.getsizeof(s) for s in strings.values())
+
+
+class TrigramIndex:
+    """Sorted distinct answer keys, with the ids of the keys that contain each trigram
+
+    The arrays are what a deck file stores, so a mapped deck reads the index from its pages
+    instead of building it.
+    """
+
+    def __init__(
+        self,
+        keys: Sequence[str],
+        trigrams: Sequence[str],
+        posting_offsets: Sequence[int],
+        postings: Sequence[int],
+    ):
+        self.keys = keys
+        self.trigrams = trigrams
+        self.posting_offsets = posting_offsets
+        self.postings = postings
+
+    @classmethod
+    def build(cls, keys: Iterable[str]) -> "TrigramIndex":
+        sorted_keys = sorted(set(keys))
+        key_ids: Dict[str, array] = {}
+        for key_id, key in enumerate(sorted_keys):
+            for trigram in _trigrams(key):
+                ids = key_ids.get(trigram)
+                if ids is None:
+                    ids = key_ids[trigram] = array("I")
+                ids.append(key_id)
+
+        trigrams = sorted(key_ids)
+        posting_offsets = array("Q", [0])
+        postings = array("I")
+        for trigram in trigrams:
+            postings.extend(key_ids[trigram])
+            posting_offsets.append(len(postings))
+        return cls(sorted_keys, trigrams, posting_offsets, postings)
+
+    def __contains__(self, key: str) -> bool:
+        i = bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def _span(self, trigram: str) -> Tuple[int, int]:
+        i = bisect_left(self.trigrams, trigram)
+        if i < len(self.trigrams) and self.trigrams[i] == trigram:
+            return self.posting_offsets[i], self.posting_offsets[i + 1]
+        return 0, 0
+
+    def keys_within(self, given_key: str, max_distance: int) -> List[str]:
+        # An edit changes at most 3 trigrams, so keys within max_distance edits share at least
+        # this many trigrams with the given key
+        trigrams = _trigrams(given_key)
+        min_shared = len(trigrams) - 3 * max_distance
+        if min_shared <= 0:
+            candidates: Iterable[int] = range(len(self.keys))
+        else:
+            # Such a key is in at least one of the n_short shortest posting lists. Only those
+            # are read in full, the lists of common trigrams are searched for the candidates.
+            spans = [span for span in map(self._span, trigrams) if span[1] > span[0]]
+            spans.sort(key=lambda span: span[1] - span[0])
+            n_short = len(spans) - min_shared + 1
+            if n_short <= 0:
+                return []
+            postings = self.postings
+            shared: Dict[int, int] = {}
+            for start, end in spans[:n_short]:
+                for key_id in postings[start:end]:
+                    shared[key_id] = shared.get(key_id, 0) + 1
+            # Trigrams that are in every key, like the start of a prefix all answers share
+            n_everywhere = sum(end - start == len(self.keys) for start, end in spans[n_short:])
+            searched = [
+                (start, end) for start, end in spans[n_short:] if end - start < len(self.keys)
+            ]
+            candidates = []
+            for key_id, n in shared.items():
+                n += n_everywhere
+                n_left = len(searched)
+                for start, end in searched:
+                    if n >= min_shared or n + n_left < min_shared:
+                        break
+                    i = bisect_left(postings, key_id, start, end)
+                    n += i < end and postings[i] == key_id
+                    n_left -= 1
+                if n >= min_shared:
+                    candidates.append(key_id)
+
+        keys = self.keys
+        if max_distance == 1:
+            return [keys[key_id] for key_id in candidates if within_one_edit(given_key, keys[key_id])]
+        return [
+            keys[key_id]
+            for key_id in candidates
+            if edit_distance(given_key, keys[key_id], max_distance) <= max_distance
+        ]
+
+
+class AnswerMatcher:
+    """Grades answers against the normalized answer keys and aliases of a deck
+
+    An answer that is not an exact match is accepted when it is within the tolerated number
+    of edits of one of the keys of the card, and no key of another card is closer. Candidates
+    for that check come from a trigram index over all keys, so only a handful of keys has to
+    be compared edit by edit. The index is built here unless the deck file provides it.
+
+    A tolerance of 1 never searches the keys of other cards, so grading takes well under a
+    millisecond on any deck. A tolerance above 1 is outside that target: on decks with
+    thousands of nearly identical answers, like "vogel 1" to "vogel 9999", the trigrams leave
+    that many candidates and a grade can take a few milliseconds.
+    """
+
+    def __init__(
+        self,
+        answer_keys: Sequence[str],
+        aliases: Optional[Sequence] = None,
+        index: Optional[TrigramIndex] = None,
+    ):
+        self._answer_keys = answer_keys
+        self._aliases = aliases
+        self.index = index or TrigramIndex.build(all_keys(answer_keys, aliases))
+
+    def card_keys(self, question_index: int) -> Tuple[str, ...]:
+        aliases = _parse_aliases(self._aliases[question_index]) if self._aliases is not None else ()
+        return (self._answer_keys[question_index], *aliases)
+
+    def keys_within(self, given_key: str, max_distance: int) -> List[str]:
+        return self.index.keys_within(given_key, max_distance)
+
+    def nbytes(self) -> int:
+        """Estimate of the memory held by the answer keys and the trigram index"""
+        index = self.index
+        return _nbytes(
+            (self._answer_keys, index.keys, index.trigrams, index.posting_offsets, index.postings)
+        )
+
+    def is_correct(self, given_answer: str, question_index: int, tolerance: int = 0) -> bool:
+        given_key = normalize_answer(given_answer)
+        card_keys = self.card_keys(question_index)
+        if given_key in card_keys:
+            return True
+        if tolerance <= 0 or given_key in self.index:
+            return False
+
+        # Short answers get fewer typos, "mees" should not match "mus"
+        distances = []
+        for key in card_keys:
+            max_distance = min(tolerance, len(key) // 4)
+            key_distance = edit_distance(given_key, key, max_distance)
+            if key_distance <= max_distance:
+                distances.append(key_distance)
+        if not distances:
+            return False
+        distance = min(distances)
+        if distance == 1:
+            return True
+        # Not correct when the answer is closer to another answer, that was probably meant
+        return not any(key not in card_keys for key in self.keys_within(given_key, distance - 1))
@@ -0,0 +1,204 @@
+"""Size-bounded cache of transcoded media, in memory and on disk
+
+Media is transcoded once per variant ("image", "audio" or "original") into a smaller file,
+stored on disk under the hash of its source, and kept in an in-memory LRU with a byte budget.
+Files that are evicted from memory are mapped from disk again instead of transcoded.
+
+Transcoding images requires Pillow (`uv add pillow`) and audio requires ffmpeg on the PATH.
+Without them, the original media is cached as is.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MAX_MEMORY_BYTES = 256 * 2**20
+MAX_DISK_BYTES = 2 * 2**30
+MAX_IMAGE_SIZE = 800  # Pixels, of the longest side
+AUDIO_BITRATE = "48k"
+
+Source = Union[bytes, str, Path]
+Buffer = Union[bytes, mmap.mmap]
+Transcoder = Callable[[bytes], bytes]
+
+_warned = set()
+
+
+def _warn_once(message: str):
+    if message not in _warned:
+        _warned.add(message)
+        logger.warning(message)
+
+
+def transcode_image(data: bytes) -> bytes:
+    import io
+
+    try:
+        from PIL import Image
+    except ImportError:
+        _warn_once("Pillow is not installed, images are cached without resizing")
+        return data
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE))
+        output = io.BytesIO()
+        image.save(output, format="WEBP", quality=80)
+    return output.getvalue()
+
+
+def transcode_audio(data: bytes) -> bytes:
+    import shutil
+    import subprocess
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        _warn_once("ffmpeg is not installed, audio is cached without transcoding")
+        return data
+    result = subprocess.run(
+        [ffmpeg, "-loglevel", "error", "-i", "pipe:0", "-ac", "1", "-c:a", "libopus"]
+        + ["-b:a", AUDIO_BITRATE, "-f", "ogg", "pipe:1"],
+        input=data,
+        capture_output=True,
+        check=True,
+    )
+    return result.stdout
+
+
+TRANSCODERS: Dict[str, Transcoder] = {
+    "original": lambda data: data,
+    "image": transcode_image,
+    "audio": transcode_audio,
+}
+
+
+@dataclass
+class MediaCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
+    memory_bytes: int = 0
+    disk_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        n_requests = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / n_requests if n_requests else 0.0
+
+
+class MediaCache:
+    """Thread-safe, so the prefetcher can warm it for all sessions at once"""
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_memory_bytes: int = MAX_MEMORY_BYTES,
+        max_disk_bytes: int = MAX_DISK_BYTES,
+        transcoders: Optional[Dict[str, Transcoder]] = None,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.transcoders = {**TRANSCODERS, **(transcoders or {})}
+        self.stats = MediaCacheStats(disk_bytes=sum(size for _, size, _ in self._list_files()))
+        self._memory: "OrderedDict[str, Buffer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, source: Source, variant: str) -> str:
+        if isinstance(source, bytes):
+            digest = hashlib.blake2b(source, digest_size=16)
+        else:
+            # Hashing a file would read it on every show, its path and version will do
+            stat = os.stat(source)
+            identity = f"{Path(source).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+            digest = hashlib.blake2b(identity.encode(), digest_size=16)
+        return f"{digest.hexdigest()}.{variant}"
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def get(self, source: Source, variant: str = "original") -> Buffer:
+        """The transcoded media, either bytes or a read-only memory map of the cached file"""
+        key = self.key(source, variant)
+        with self._lock:
+            buffer = self._memory.get(key)
+            if buffer is not None:
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+                return buffer
+
+        path = self._path(key)
+        if path.exists():
+            buffer = _map_file(path)
+            with self._lock:
+                self.stats.disk_hits += 1
+        else:
+            data = source if isinstance(source, bytes) else Path(source).read_bytes()
+            buffer = self.transcoders[variant](data)
+            self._write(path, buffer)
+            with self._lock:
+                self.stats.misses += 1
+        self._put(key, buffer)
+        return buffer
+
+    def _put(self, key: str, buffer: Buffer):
+        with self._lock:
+            if key in self._memory or len(buffer) > self.max_memory_bytes:
+                return
+            self._memory[key] = buffer
+            self.stats.memory_bytes += len(buffer)
+            while self.stats.memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self.stats.memory_bytes -= len(evicted)
+                self.stats.evictions += 1
+                self.stats.evicted_bytes += len(evicted)
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats.disk_bytes += len(data)
+            prune = self.stats.disk_bytes > self.max_disk_bytes
+        if prune:
+            self._prune_disk()
+
+    def _list_files(self) -> List[Tuple[float, int, Path]]:
+        files = []
+        for path in self.cache_dir.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Pruned or replaced by another thread
+                continue
+            if not path.name.endswith(".tmp"):
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _prune_disk(self):
+        # Least recently written first, down to 90% of the budget to not prune on every write
+        files = sorted(self._list_files())
+        disk_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if disk_bytes <= 0.9 * self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)  # Maps of the file stay valid
+            disk_bytes -= size
+        with self._lock:
+            self.stats.disk_bytes = disk_bytes
+
+
+def _map_file(path: Path) -> Buffer:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""  # Empty files cannot be mapped
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
@@ -0,0 +1,39 @@
+import pandas as pd
+import streamlit as st
+
+from flip_cards import app_utils
+from flip_cards.analytics import CardCounters, tag_counters
+
+st.set_page_config(page_title="Moeilijkheid", page_icon="📊", layout="wide")
+
+app_utils.load_env()
+app_utils.you_shall_not_password()
+
+
+def _difficulty_table(names: pd.Series, counters: CardCounters, min_attempts: int) -> pd.DataFrame:
+    table = pd.DataFrame(
+        {
+            "Pogingen": counters.attempts,
+            "Fout (%)": (counters.error_rate * 100).round(),
+            "Seconden": counters.mean_seconds.round(1),
+        },
+        index=names,
+    )
+    table = table[table["Pogingen"] >= max(min_attempts, 1)]
+    return table.sort_values(["Fout (%)", "Pogingen"], ascending=False)
+
+
+deck_ids = list(app_utils.get_deck_paths())
+deck_id = st.sidebar.selectbox("Kaartenset", deck_ids)
+deck = app_utils.load_deck(deck_id)
+min_attempts = st.sidebar.number_input("Minimaal aantal pogingen", min_value=1, value=5)
+
+# Totals per card come from the aggregates, the answers themselves are not stored
+card_counters = app_utils.get_analytics().card_counters(deck)
+tags = tag_counters(deck, card_counters)
+st.subheader("📊 Moeilijkheid per tag")
+st.dataframe(_difficulty_table(pd.Series(tags.tags, name="Tag"), tags.counters, min_attempts))
+
+st.subheader("📊 Moeilijkheid per kaart")
+cards = pd.Series(deck.correct_answers, name="Antwoord")
+st.dataframe(_difficulty_table(cards, card_counters, min_attempts))
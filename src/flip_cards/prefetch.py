@@ -0,0 +1,61 @@
+import logging
+import sys
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+N_PREFETCH = 3  # Cards to look ahead
+N_WORKERS = 4
+
+T = TypeVar("T")
+
+
+class Prefetcher(Generic[T]):
+    """Fetches the media of upcoming cards in the background, for one session
+
+    The executor is shared by all sessions. prefetch() is called with the new look-ahead
+    window whenever the queue changes, which cancels fetches that did not start yet for cards
+    that fell out of it and drops their results.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, fetch: Callable[[int], T]):
+        self._executor = executor
+        self._fetch = fetch
+        self._futures: Dict[int, "Future[T]"] = {}
+
+    def prefetch(self, question_indices: Iterable[int]):
+        window = dict.fromkeys(question_indices)
+        for question_index in list(self._futures):
+            if question_index not in window:
+                self._futures.pop(question_index).cancel()
+        for question_index in window:
+            if question_index not in self._futures:
+                self._futures[question_index] = self._executor.submit(self._fetch, question_index)
+
+    def get(self, question_index: int, timeout: Optional[float] = None) -> T:
+        """The fetched media, waiting for a fetch in progress or fetching it right away"""
+        future = self._futures.get(question_index)
+        if future is not None:
+            try:
+                return future.result(timeout)
+            except CancelledError:
+                pass
+            except Exception:
+                # Not cached, so the fetch below raises again if the error is not transient
+                logger.exception("Prefetching media of question %s failed", question_index)
+                del self._futures[question_index]
+        return self._fetch(question_index)
+
+    def cancel(self):
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+
+    def nbytes(self) -> int:
+        """Estimate of the memory held by the fetched media of this session"""
+        n_bytes = sys.getsizeof(self._futures)
+        for future in self._futures.values():
+            if future.done() and not future.cancelled() and future.exception() is None:
+                n_bytes += sys.getsizeof(future.result())
+        return n_bytes
@@ -0,0 +1,164 @@
+import logging
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    user_id TEXT NOT NULL,
+    deck_id TEXT NOT NULL,
+    question_index INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    answered_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_user_deck ON answers (user_id, deck_id);
+CREATE TABLE IF NOT EXISTS progress (
+    user_id TEXT NOT NULL,
+    deck_id TEXT NOT NULL,
+    snapshot BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, deck_id)
+);
+CREATE TABLE IF NOT EXISTS progress_steps (
+    user_id TEXT NOT NULL,
+    deck_id TEXT NOT NULL,
+    question_index INTEGER NOT NULL,
+    correct INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS progress_steps_user_deck ON progress_steps (user_id, deck_id);
+"""
+
+_STOP = object()
+
+
+class ProgressStore:
+    """Per-user progress and answer history in a local SQLite database
+
+    Writes are queued and committed in batches by a background thread, so recording an
+    answer never waits for the disk. Progress is a snapshot that is saved when an overhoring
+    starts, plus a small step per answer after it, so saving does not slow down with the
+    size of the overhoring. Snapshots are pickled, the database is meant to be private to
+    the app.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+
+        with closing(self._connect()) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(_SCHEMA)
+
+        self._writer = threading.Thread(
+            target=self._write_loop, name="progress-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record_answer(self, user_id: str, deck_id: str, question_index: int, correct: bool):
+        self._queue.put(("answer", (user_id, deck_id, question_index, int(correct), time.time())))
+
+    def save_progress(self, user_id: str, deck_id: str, snapshot: Dict[str, Any]):
+        """Replaces the progress, the steps saved before this are dropped"""
+        # Pickled right away, since the objects in the snapshot keep changing after this call
+        data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+        self._queue.put(("progress", (user_id, deck_id, data, time.time())))
+
+    def save_step(self, user_id: str, deck_id: str, question_index: int, correct: bool):
+        """Adds an answer to the progress saved last"""
+        self._queue.put(("step", (user_id, deck_id, question_index, int(correct))))
+
+    def load_progress(
+        self, user_id: str, deck_id: str
+    ) -> Optional[Tuple[Dict[str, Any], List[Tuple[int, bool]]]]:
+        """The snapshot saved last and the steps saved after it"""
+        key = (user_id, deck_id)
+        with closing(self._connect()) as connection:
+            # One read transaction, so the steps belong to the snapshot
+            connection.execute("BEGIN")
+            row = connection.execute(
+                "SELECT snapshot FROM progress WHERE user_id = ? AND deck_id = ?", key
+            ).fetchone()
+            steps = connection.execute(
+                "SELECT question_index, correct FROM progress_steps"
+                " WHERE user_id = ? AND deck_id = ? ORDER BY rowid",
+                key,
+            ).fetchall()
+            connection.rollback()
+        if not row:
+            return None
+        try:
+            snapshot = pickle.loads(row[0])
+        except Exception:
+            # E.g. written by a version of the app whose classes changed since
+            logger.warning("Ignoring unreadable progress of %s for deck %s", user_id, deck_id)
+            return None
+        return snapshot, [(question_index, bool(correct)) for question_index, correct in steps]
+
+    def flush(self):
+        """Blocks until everything queued so far is written"""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    def _next_batch(self) -> Tuple[List, bool]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        stop = batch[-1] is _STOP
+        return [item for item in batch if item is not _STOP], stop
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List):
+        answers = [row for kind, row in batch if kind == "answer"]
+        with connection:
+            connection.executemany("INSERT INTO answers VALUES (?, ?, ?, ?, ?)", answers)
+            # Steps belong to the snapshot before them, so these are written in order
+            for kind, row in batch:
+                if kind == "progress":
+                    connection.execute(
+                        "DELETE FROM progress_steps WHERE user_id = ? AND deck_id = ?", row[:2]
+                    )
+                    connection.execute("INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?)", row)
+                elif kind == "step":
+                    connection.execute("INSERT INTO progress_steps VALUES (?, ?, ?, ?)", row)
+
+    def _write_loop(self):
+        connection = self._connect()
+        stop = False
+        while not stop:
+            batch, stop = self._next_batch()
+            try:
+                self._write_batch(connection, batch)
+            except sqlite3.Error:
+                logger.exception("Failed to write %d progress updates", len(batch))
+            finally:
+                for _ in range(len(batch) + stop):
+                    self._queue.task_done()
+        connection.close()
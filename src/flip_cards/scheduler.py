@@ -0,0 +1,175 @@
+import heapq
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+INFINITE_PRACTICE_LENGTH = 100000  # Not really infinite
+
+
+class CardState:
+    __slots__ = ("box", "n_reviews")
+
+    def __init__(self, box: int = 0, n_reviews: int = 0):
+        self.box = box
+        self.n_reviews = n_reviews
+
+
+class SchedulingPolicy:
+    """Decides when a question is asked again, in steps (questions asked) from now on"""
+
+    def schedule(
+        self, state: CardState, correct: bool, step: int, rng: random.Random
+    ) -> Optional[int]:
+        """Updates the card state and returns the step at which the card is due again
+
+        Returning None retires the card, it is then not asked again.
+        """
+        raise NotImplementedError
+
+
+class LeitnerPolicy(SchedulingPolicy):
+    """Leitner boxes: a wrong answer moves the card to the first box and asks it again soon,
+    a correct answer moves it one box up, doubling the time until it is asked again
+    """
+
+    def __init__(
+        self,
+        n_boxes: int = 5,
+        retry_delay: Tuple[int, int] = (3, 8),
+        retire_correct: bool = False,
+    ):
+        self.n_boxes = n_boxes
+        self.retry_delay = retry_delay
+        self.retire_correct = retire_correct
+
+    def schedule(
+        self, state: CardState, correct: bool, step: int, rng: random.Random
+    ) -> Optional[int]:
+        state.n_reviews += 1
+        if not correct:
+            state.box = 0
+            return step + rng.randint(*self.retry_delay)
+        if self.retire_correct:
+            return None
+        state.box = min(state.box + 1, self.n_boxes - 1)
+        return step + self.retry_delay[1] * 2**state.box + rng.randint(*self.retry_delay)
+
+
+class Scheduler:
+    """Priority queue of questions ordered by the step at which they are due
+
+    The current question stays at the top of the heap until advance() is called. An answer
+    only records when the question is due again, so it can still be changed until then.
+    With a length, the scheduler repeats questions until that many have been asked.
+    """
+
+    def __init__(
+        self,
+        question_indices: Sequence[int],
+        policy: SchedulingPolicy,
+        length: Optional[int] = None,
+        seed: Optional[int] = None,
+    ):
+        if not question_indices:
+            raise ValueError("Cannot schedule without questions")
+        self.policy = policy
+        self.length = length
+        self.seed = seed
+        self.step = 0
+        self._random = random.Random(seed)
+        self._cards: Dict[int, CardState] = {i: CardState() for i in question_indices}
+        self._pending_due: Optional[int] = None
+        self._pending = False
+
+        order = list(self._cards)
+        self._random.shuffle(order)
+        self._heap: List[Tuple[int, int, int]] = [
+            (due, due, question_index) for due, question_index in enumerate(order)
+        ]
+        self._n_pushed = len(self._heap)  # Tie-breaker for questions that are due at once
+
+    def __len__(self) -> int:
+        if self.length is not None and self._heap:
+            return self.length - self.step
+        return len(self._heap)
+
+    @property
+    def current(self) -> int:
+        if not len(self):
+            raise IndexError("No questions left")
+        return self._heap[0][2]
+
+    @property
+    def answered(self) -> bool:
+        """Whether the current question was rescheduled, but not advanced yet"""
+        return self._pending
+
+    def card_state(self, question_index: int) -> CardState:
+        return self._cards[question_index]
+
+    def upcoming(self, k: int) -> List[int]:
+        """The next k questions after the current one, in the order they will be asked
+
+        Walks the heap best first, so only about k entries are visited. Questions answered
+        later on can still change this order.
+        """
+        k = min(k, len(self) - 1)
+        if k <= 0:
+            return []
+        upcoming: List[int] = []
+        frontier: List[Tuple[Tuple[int, int, int], int]] = []
+
+        def _push_children(i: int):
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child], child))
+
+        _push_children(0)
+        if self._pending and self._pending_due is not None:
+            # Where advance() will put the current question back
+            frontier.append(((self._pending_due, self._n_pushed, self.current), -1))
+            heapq.heapify(frontier)
+        while frontier and len(upcoming) < k:
+            (_, _, question_index), i = heapq.heappop(frontier)
+            upcoming.append(question_index)
+            if i >= 0:
+                _push_children(i)
+        return upcoming
+
+    def remap(self, mapping: Dict[int, int]):
+        """Renumbers the questions after the deck changed, questions not in mapping are dropped
+
+        The order of the remaining questions does not change.
+        """
+        current = self._heap[0][2] if self._heap else None
+        self._heap = [(due, n, mapping[i]) for due, n, i in self._heap if i in mapping]
+        heapq.heapify(self._heap)
+        self._cards = {mapping[i]: state for i, state in self._cards.items() if i in mapping}
+        if current not in mapping:
+            self._pending = False
+            self._pending_due = None
+
+    def reschedule(self, question_index: int, correct: bool):
+        if question_index != self.current:
+            raise ValueError("Only the current question can be rescheduled")
+        state = self._cards[question_index]
+        self._pending_due = self.policy.schedule(state, correct, self.step, self._random)
+        self._pending = True
+
+    def advance(self) -> int:
+        """Removes the current question and puts it back at its due step, if it has one"""
+        question_index = self.current
+        heapq.heappop(self._heap)
+        if self._pending:
+            due = self._pending_due
+        elif self.length is not None:
+            # Skipped while repeating, ask it again after all others
+            due = self.step + len(self._cards)
+        else:
+            due = None
+        if due is not None:
+            heapq.heappush(self._heap, (due, self._n_pushed, question_index))
+            self._n_pushed += 1
+        self._pending = False
+        self._pending_due = None
+        self.step += 1
+        return question_index
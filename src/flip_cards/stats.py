@@ -0,0 +1,48 @@
+from array import array
+from typing import Dict, Sequence
+
+
+class CardStats:
+    """Fixed-size attempt and correct counters per question in the overhoring"""
+
+    def __init__(self, question_indices: Sequence[int]):
+        self._slots = {question_index: slot for slot, question_index in enumerate(question_indices)}
+        self.attempts = array("I", [0]) * len(self._slots)
+        self.correct = array("I", [0]) * len(self._slots)
+        self.n_questions = len(self._slots)
+        self.n_seen = 0  # Unique questions answered at least once
+        self.n_attempts = 0
+        self.n_correct = 0
+
+    def remap(self, mapping: Dict[int, int]):
+        """Renumbers the questions after the deck changed, questions not in mapping are dropped
+
+        Totals only count the answers to the remaining questions.
+        """
+        kept = [(mapping[i], slot) for i, slot in self._slots.items() if i in mapping]
+        self._slots = {question_index: slot for slot, (question_index, _) in enumerate(kept)}
+        self.attempts = array("I", [self.attempts[slot] for _, slot in kept])
+        self.correct = array("I", [self.correct[slot] for _, slot in kept])
+        self.n_questions = len(kept)
+        self.n_seen = sum(1 for attempts in self.attempts if attempts)
+        self.n_attempts = sum(self.attempts)
+        self.n_correct = sum(self.correct)
+
+    def is_seen(self, question_index: int) -> bool:
+        return self.attempts[self._slots[question_index]] > 0
+
+    def n_attempts_of(self, question_index: int) -> int:
+        return self.attempts[self._slots[question_index]]
+
+    def n_correct_of(self, question_index: int) -> int:
+        return self.correct[self._slots[question_index]]
+
+    def record(self, question_index: int, correct: bool):
+        slot = self._slots[question_index]
+        if not self.attempts[slot]:
+            self.n_seen += 1
+        self.attempts[slot] += 1
+        self.n_attempts += 1
+        if correct:
+            self.correct[slot] += 1
+            self.n_correct += 1
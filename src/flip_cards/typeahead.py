@@ -0,0 +1,93 @@
+from array import array
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Set, Tuple, Union
+
+from flip_cards.matching import normalize_answer
+
+N_SUGGESTIONS = 8
+# Below this fraction of the answers, a selection gets an index of its own. Filtering the
+# shared index would skip over the entries of all other answers on every completion.
+MIN_FILTERED_FRACTION = 0.01
+
+
+class Typeahead:
+    """Sorted index of normalized answers for prefix completion
+
+    Every word of an answer is indexed, so "specht" completes to "Zwarte Specht" as well. The
+    index consists of the sorted distinct answers, the sorted keys with the id of the answer
+    they belong to and the answer id of every card. Deck files store these arrays, so a
+    mapped deck does not have to build the index.
+    """
+
+    def __init__(
+        self,
+        answers: Sequence[str],
+        keys: Sequence[str],
+        answer_ids: Sequence[int],
+        card_answer_ids: Sequence[int],
+    ):
+        self.answers = answers
+        self.keys = keys
+        self.answer_ids = answer_ids
+        self.card_answer_ids = card_answer_ids
+
+    @classmethod
+    def build(cls, card_answers: Sequence[str]) -> "Typeahead":
+        answers = sorted(set(card_answers))
+        entries: List[Tuple[str, int]] = []
+        for answer_id, answer in enumerate(answers):
+            key = normalize_answer(answer)
+            entries.append((key, answer_id))
+            for i, char in enumerate(key):
+                if char == " ":
+                    entries.append((key[i + 1 :], answer_id))
+        entries.sort()
+        ids = {answer: answer_id for answer_id, answer in enumerate(answers)}
+        return cls(
+            answers,
+            [key for key, _ in entries],
+            array("I", [answer_id for _, answer_id in entries]),
+            array("I", [ids[answer] for answer in card_answers]),
+        )
+
+    def complete(
+        self, prefix: str, k: int = N_SUGGESTIONS, allowed: Optional[bytearray] = None
+    ) -> List[str]:
+        """Answers with a word that starts with prefix, only those in allowed if given"""
+        prefix = normalize_answer(prefix)
+        completions: List[str] = []
+        seen: Set[int] = set()
+        i = bisect_left(self.keys, prefix)
+        while i < len(self.keys) and len(completions) < k:
+            if not self.keys[i].startswith(prefix):
+                break
+            answer_id = self.answer_ids[i]
+            if answer_id not in seen and (allowed is None or allowed[answer_id]):
+                seen.add(answer_id)
+                completions.append(self.answers[answer_id])
+            i += 1
+        return completions
+
+    def restrict(self, question_indices: Sequence[int]) -> Union["Typeahead", "TypeaheadSelection"]:
+        """Completions limited to the answers of the given cards"""
+        allowed = bytearray(len(self.answers))
+        for i in question_indices:
+            allowed[self.card_answer_ids[i]] = 1
+        if allowed.count(1) < len(self.answers) * MIN_FILTERED_FRACTION:
+            return Typeahead.build(
+                [self.answers[self.card_answer_ids[i]] for i in question_indices]
+            )
+        return TypeaheadSelection(self, allowed)
+
+
+class TypeaheadSelection:
+    """Completions of a shared Typeahead, filtered by a byte per answer"""
+
+    __slots__ = ("typeahead", "allowed")
+
+    def __init__(self, typeahead: Typeahead, allowed: bytearray):
+        self.typeahead = typeahead
+        self.allowed = allowed
+
+    def complete(self, prefix: str, k: int = N_SUGGESTIONS) -> List[str]:
+        return self.typeahead.complete(prefix, k, self.allowed)
@@ -0,0 +1,78 @@
+import pytest
+
+from flip_cards.auth import Authenticator, AuthResult, RateLimiter
+
+SECRET = b"s" * 32
+
+
+def test_bucket_allows_a_burst_then_refills():
+    limiter = RateLimiter(capacity=3, refill_seconds=60)
+    assert all(limiter.acquire("a", now=0).ok for _ in range(3))
+    refused = limiter.acquire("a", now=0)
+    assert refused == AuthResult(False, 60.0, rate_limited=True)
+    assert limiter.acquire("a", now=30).retry_after == pytest.approx(30)
+    assert limiter.acquire("a", now=60).ok
+    assert not limiter.acquire("a", now=60).ok
+    # Other clients have their own bucket
+    assert limiter.acquire("b", now=60).ok
+
+
+def test_bucket_does_not_refill_above_capacity():
+    limiter = RateLimiter(capacity=2, refill_seconds=60)
+    assert limiter.acquire("a", now=0).ok
+    assert [limiter.acquire("a", now=3600).ok for _ in range(3)] == [True, True, False]
+
+
+def test_wrong_password_locks_out():
+    auth = Authenticator("geheim", SECRET, RateLimiter(lockout_seconds=3))
+    assert auth.check_password("a", "fout", now=0) == AuthResult(False, 3.0)
+    locked = auth.check_password("a", "geheim", now=1)
+    assert locked.rate_limited
+    assert locked.retry_after == pytest.approx(2)
+    assert auth.check_password("b", "geheim", now=1).ok
+    assert auth.check_password("a", "geheim", now=3).ok
+
+
+def test_lockout_and_bucket_together():
+    auth = Authenticator("geheim", SECRET, RateLimiter(capacity=2, lockout_seconds=3))
+    assert not auth.check_password("a", "fout", now=0).ok
+    assert not auth.check_password("a", "fout", now=5).ok
+    # Bucket is empty, the next attempt is refused before the password is compared
+    result = auth.check_password("a", "geheim", now=10)
+    assert result.rate_limited
+    assert result.retry_after == pytest.approx(50)
+
+
+def test_token_expires():
+    auth = Authenticator("geheim", SECRET, token_ttl=100)
+    token = auth.issue_token(now=1000)
+    assert auth.verify_token(token, now=1000)
+    assert auth.verify_token(token, now=1099)
+    assert not auth.verify_token(token, now=1100)
+
+
+def test_token_is_valid_for_same_secret_only():
+    token = Authenticator("geheim", SECRET).issue_token(now=0)
+    assert Authenticator("ander", SECRET).verify_token(token, now=0)
+    assert not Authenticator("geheim", b"t" * 32).verify_token(token, now=0)
+    # Without a secret, every process has its own
+    assert not Authenticator("geheim").verify_token(Authenticator("geheim").issue_token())
+
+
+def test_tampered_token_is_refused():
+    auth = Authenticator("geheim", SECRET, token_ttl=100)
+    token = auth.issue_token(now=0)
+    expires, nonce, signature = token.split(".")
+    assert not auth.verify_token(f"{int(expires) + 1000}.{nonce}.{signature}", now=0)
+    assert not auth.verify_token(f"{expires}.{nonce}x.{signature}", now=0)
+    flipped = "0" if signature[-1] != "0" else "1"
+    assert not auth.verify_token(f"{expires}.{nonce}.{signature[:-1]}{flipped}", now=0)
+    assert not auth.verify_token(f"{expires}.{nonce}", now=0)
+    for token in (None, "", "geen token", f"{expires}.{nonce}.é"):
+        assert not auth.verify_token(token, now=0)
+
+
+def test_signed_payload_without_expiry_is_refused():
+    auth = Authenticator("geheim", SECRET)
+    payload = "nooit.abc"
+    assert not auth.verify_token(f"{payload}.{auth._sign(payload)}", now=0)
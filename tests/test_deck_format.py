@@ -0,0 +1,117 @@
+import struct
+import threading
+
+import pytest
+
+from flip_cards import deck_format
+from flip_cards.deck import DeckBuilder
+from flip_cards.deck_format import DeckFormatError, MappedDeck, open_deck, write_deck
+from flip_cards.index import QuestionIndex
+from flip_cards.matching import AnswerMatcher
+
+
+def _deck():
+    builder = DeckBuilder()
+    builder.add(
+        question="Welke vogel zingt tuu tii?",
+        answer="Koolmees",
+        tags=["mezen", "tuin"],
+        info="Zingt al in januari",
+        aliases="Kool mees",
+    )
+    builder.add(question="Welke vogel heeft een rode borst?", answer="Roodborst", tags=["tuin"])
+    builder.add(
+        question="Welke vogel roept zijn naam?",
+        answer="Grutto",
+        tags=[],
+        info="",
+        aliases=["Grutto!"],
+        sound={"path": "grutto.mp3", "seconds": 2.5},
+    )
+    return builder.build()
+
+
+@pytest.fixture
+def deck_path(tmp_path):
+    path = tmp_path / f"vogels{deck_format.SUFFIX}"
+    write_deck(_deck(), path)
+    return path
+
+
+def test_round_trip(deck_path):
+    deck = _deck()
+    mapped = open_deck(deck_path)
+    assert isinstance(mapped, MappedDeck)
+    assert len(mapped) == len(deck)
+    assert list(mapped.questions) == list(deck.questions)
+    assert list(mapped.answers) == list(deck.answers)
+    assert [mapped.info(i) for i in range(3)] == ["Zingt al in januari", "", ""]
+    assert [mapped.tags(i) for i in range(3)] == [("mezen", "tuin"), ("tuin",), ()]
+    assert mapped.tag_vocabulary == deck.tag_vocabulary
+    assert [mapped.answer_key(i) for i in range(3)] == ["koolmees", "roodborst", "grutto"]
+    assert list(mapped.suggestions()) == list(deck.suggestions())
+    assert mapped[0]["question"] == deck[0]["question"]
+
+
+def test_extra_columns(deck_path):
+    mapped = open_deck(deck_path)
+    assert set(mapped.extra_columns) == {"aliases", "sound"}
+    assert list(mapped.extra_columns["aliases"]) == ["Kool mees", None, ["Grutto!"]]
+    assert mapped.extra_columns["sound"][2] == {"path": "grutto.mp3", "seconds": 2.5}
+    assert mapped.extra_columns["sound"][0] is None
+
+
+def test_tag_bits(deck_path):
+    mapped = open_deck(deck_path)
+    tag_bits = mapped.tag_bits()
+    assert dict(tag_bits.items()) == _deck().tag_bits()
+    assert tag_bits["tuin"] == 0b011
+    assert tag_bits.get("weide", 0) == 0
+    assert QuestionIndex.from_deck(mapped).tags_in_bits(0b100) == []
+
+
+def test_prebuilt_indices(deck_path):
+    mapped = open_deck(deck_path)
+    index = mapped.trigram_index()
+    assert list(index.keys) == ["grutto", "grutto!", "kool mees", "koolmees", "roodborst"]
+    assert index.keys_within("kolmees", 1) == ["koolmees"]
+    # Read from the mapped file, which the deck counts
+    assert AnswerMatcher(mapped.answer_keys(), index=index).nbytes() == 0
+    typeahead = mapped.typeahead()
+    assert typeahead.complete("KOOL") == ["Koolmees"]
+    assert typeahead.complete("mees") == []
+    assert typeahead.restrict([1]).complete("") == ["Roodborst"]
+
+
+def test_version_check(deck_path):
+    data = bytearray(deck_path.read_bytes())
+    struct.pack_into("<I", data, 8, deck_format.VERSION + 1)
+    deck_path.write_bytes(bytes(data))
+    with pytest.raises(DeckFormatError, match="format version"):
+        open_deck(deck_path)
+
+
+def test_not_a_deck_file(tmp_path):
+    path = tmp_path / "vogels.flipdeck"
+    path.write_text("question,answer\n")
+    with pytest.raises(DeckFormatError):
+        open_deck(path)
+
+
+@pytest.mark.parametrize("size", [0, 4, 40, -8])
+def test_empty_or_truncated_file(deck_path, size):
+    data = deck_path.read_bytes()
+    deck_path.write_bytes(data[:size])
+    with pytest.raises(DeckFormatError):
+        open_deck(deck_path)
+
+
+def test_concurrent_writes(deck_path):
+    deck = _deck()
+    threads = [threading.Thread(target=write_deck, args=(deck, deck_path)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert list(open_deck(deck_path).answers) == list(deck.answers)
+    assert [path.name for path in deck_path.parent.iterdir()] == [deck_path.name]
@@ -0,0 +1,158 @@
+import pickle
+
+import pytest
+
+from flip_cards.config import Config
+from flip_cards.deck import DeckBuilder
+from flip_cards.deck_store import SharedDeck
+from flip_cards.engine import Progress, QuizError, QuizSession
+
+
+def _shared_deck(answers, version: int = 1) -> SharedDeck:
+    builder = DeckBuilder()
+    for answer in answers:
+        builder.add(question=f"Welke vogel is {answer}?", answer=answer, tags=["vogels"])
+    deck = builder.build()
+    return SharedDeck("test", version, deck, deck.answers)
+
+
+def _config(n_questions: int, infinite_practice: bool = False):
+    config = Config().dict()
+    config["random_selection"] = False
+    config["question_start_index"] = 0
+    config["question_end_index"] = n_questions
+    config["infinite_practice"] = infinite_practice
+    return config
+
+
+ANSWERS = ["Merel", "Koolmees", "Roodborst", "Vink"]
+
+
+def _answer(session: QuizSession, correct: bool) -> int:
+    question_index = session.current
+    answer = session.deck.correct_answers[question_index] if correct else "Kip"
+    session.answer(answer)
+    session.advance()
+    return question_index
+
+
+def test_progress_counts_first_answers():
+    session = QuizSession(_shared_deck(ANSWERS), _config(4), seed=1)
+    assert session.progress() == Progress(0, 4, 0, 0)
+    wrong = _answer(session, False)
+    _answer(session, True)
+    assert session.progress() == Progress(2, 4, 1, 2)
+    while session.current != wrong:
+        _answer(session, True)
+    # A correct answer after a wrong one does not count as correct
+    _answer(session, True)
+    assert session.finished
+    progress = session.progress()
+    assert progress == Progress(4, 4, 3, 4)
+    assert (progress.done_fraction, progress.correct_fraction) == (1.0, 0.75)
+
+
+def test_progress_counts_attempts_when_practicing_infinitely():
+    session = QuizSession(_shared_deck(ANSWERS), _config(4, infinite_practice=True), seed=1)
+    for correct in (True, False, True, True, False):
+        _answer(session, correct)
+    progress = session.progress()
+    assert (progress.n_done, progress.n_correct, progress.n_graded) == (5, 3, 5)
+    # Answered, but not advanced yet
+    session.answer("Kip")
+    assert session.progress().n_done == 6
+
+
+def test_too_many_questions():
+    with pytest.raises(QuizError):
+        QuizSession(_shared_deck(ANSWERS), _config(5))
+
+
+def test_remap_follows_cards_to_new_deck():
+    session = QuizSession(_shared_deck(ANSWERS), _config(4), seed=1)
+    asked = [_answer(session, True) for _ in range(2)]
+    answers = [session.deck.correct_answers[i] for i in asked]
+    session.remap(_shared_deck(list(reversed(ANSWERS)), version=2))
+    progress = session.progress()
+    assert progress == Progress(2, 4, 2, 2)
+    assert {session.deck.correct_answers[i] for i in session.question_indices} == set(ANSWERS)
+    seen = [i for i in session.question_indices if session.card_stats.is_seen(i)]
+    assert {session.deck.correct_answers[i] for i in seen} == set(answers)
+
+
+def test_remap_takes_dropped_cards_out_of_the_score():
+    session = QuizSession(_shared_deck(ANSWERS), _config(4), seed=1)
+    dropped = session.deck.correct_answers[_answer(session, True)]
+    _answer(session, False)
+    session.remap(_shared_deck([answer for answer in ANSWERS if answer != dropped], version=2))
+    progress = session.progress()
+    assert progress == Progress(1, 3, 0, 1)
+    assert progress.correct_fraction <= 1.0
+
+
+def test_remap_infinite_practice_subtracts_correct_attempts():
+    session = QuizSession(_shared_deck(ANSWERS), _config(4, infinite_practice=True), seed=1)
+    answered = [_answer(session, True) for _ in range(6)]
+    dropped = session.deck.correct_answers[answered[0]]
+    n_dropped = answered.count(answered[0])
+    session.remap(_shared_deck([answer for answer in ANSWERS if answer != dropped], version=2))
+    progress = session.progress()
+    assert progress.n_correct == progress.n_graded == 6 - n_dropped
+    assert dropped not in {session.deck.correct_answers[i] for i in session.question_indices}
+
+
+def test_remap_to_empty_deck_finishes_and_has_no_progress_left():
+    session = QuizSession(_shared_deck(ANSWERS), _config(4), seed=1)
+    _answer(session, True)
+    session.remap(_shared_deck(["Kip"], version=2))
+    assert session.finished
+    progress = session.progress()
+    assert progress.n_total == 0
+    assert progress.done_fraction == 1.0
+
+
+def _steps(session: QuizSession, answers):
+    steps = []
+    for correct in answers:
+        if session.answered:
+            session.advance()
+        steps.append((session.current, correct))
+        session.answer(session.deck.correct_answers[session.current] if correct else "Kip")
+    return steps
+
+
+@pytest.mark.parametrize("infinite", [False, True])
+def test_replay_recreates_session(infinite):
+    deck = _shared_deck(ANSWERS)
+    session = QuizSession(deck, _config(4, infinite), seed=5)
+    base = session.base_snapshot()
+    assert set(base) == {"config", "seed"}
+    steps = _steps(session, [False, True, True, False, True])
+    replayed = QuizSession.replay(deck, base, steps)
+    assert replayed.progress() == session.progress()
+    assert replayed.answered
+    assert (replayed.current, replayed.queue.upcoming(3)) == (
+        session.current,
+        session.queue.upcoming(3),
+    )
+
+
+def test_replay_after_remap_starts_from_full_snapshot():
+    session = QuizSession(_shared_deck(ANSWERS), _config(4), seed=1)
+    _answer(session, False)
+    deck = _shared_deck(list(reversed(ANSWERS)), version=2)
+    session.remap(deck)
+    # Pickled right away, like the progress store does
+    base = pickle.loads(pickle.dumps(session.base_snapshot()))
+    assert "queue" in base
+    steps = _steps(session, [True, False])
+    assert QuizSession.replay(deck, base, steps).progress() == session.progress()
+
+
+def test_replay_refuses_steps_of_another_session():
+    deck = _shared_deck(ANSWERS)
+    session = QuizSession(deck, _config(4), seed=1)
+    base = session.base_snapshot()
+    other = next(i for i in session.question_indices if i != session.current)
+    with pytest.raises(QuizError):
+        QuizSession.replay(deck, base, [(other, True)])
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from flip_cards.deck import DeckBuilder
+from flip_cards.deck_format import open_deck, write_deck
+from flip_cards.deck_store import DeckStore, file_stat
+from flip_cards.hot_reload import DeckWatcher, reload_deck
+
+
+def _write(path, answers):
+    builder = DeckBuilder()
+    for answer in answers:
+        builder.add(question=f"Welke vogel is {answer}?", answer=answer, tags=["vogels"])
+    write_deck(builder.build(), path)
+
+
+@pytest.fixture
+def deck_path(tmp_path):
+    path = str(tmp_path / "vogels.flipdeck")
+    _write(path, ["Merel", "Vink"])
+    return path
+
+
+def _load(store, path, during_load=None):
+    def _open():
+        deck = open_deck(path)
+        if during_load is not None:
+            during_load()
+        return deck, deck.answers
+
+    return store.get_or_load("vogels", _open, lambda: file_stat(path))
+
+
+def test_change_while_loading_is_reloaded(deck_path):
+    store = DeckStore()
+    deck = _load(store, deck_path, lambda: _write(deck_path, ["Merel", "Vink", "Kievit"]))
+    assert len(deck) == 2
+    watcher = DeckWatcher(store, lambda: {"vogels": deck_path})
+    watcher.check()
+    assert len(store.get("vogels")) == 3
+    assert store.get("vogels").version == 2
+    watcher.check()
+    assert store.get("vogels").version == 2
+
+
+def test_failed_reload_is_retried_when_the_file_changes(deck_path, monkeypatch):
+    store = DeckStore()
+    _load(store, deck_path)
+    watcher = DeckWatcher(store, lambda: {"vogels": deck_path})
+    reloads = []
+
+    def _reload(store, deck_id, path):
+        reloads.append(path)
+        return reload_deck(store, deck_id, path)
+
+    monkeypatch.setattr("flip_cards.hot_reload.reload_deck", _reload)
+    with open(deck_path, "wb") as f:
+        f.write(b"half a deck")
+    watcher.check()
+    watcher.check()
+    assert len(reloads) == 1
+    assert store.get("vogels").version == 1
+
+    _write(deck_path, ["Merel", "Vink", "Kievit"])
+    os.utime(deck_path, ns=(0, 0))  # Even when the modification time is older
+    watcher.check()
+    assert len(reloads) == 2
+    assert len(store.get("vogels")) == 3
+
+
+def test_evicted_deck_is_not_reloaded(deck_path):
+    store = DeckStore(ttl=0)
+    _load(store, deck_path)
+    _write(deck_path, ["Merel"])
+    store.get_or_load("bomen", lambda: ([{"question": "Welke boom?", "tags": []}], ["Eik"]))
+    assert "vogels" not in store
+    assert reload_deck(store, "vogels", deck_path) is None
+    assert "vogels" not in store
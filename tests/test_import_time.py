@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("resource")  # Not on Windows
+
+from check_import_time import BUDGETS, DependencyMissing, check_budget, compile_sources  # noqa: E402
+
+
+@pytest.fixture(scope="module", autouse=True)
+def compiled():
+    compile_sources()
+
+
+@pytest.mark.parametrize("budget", BUDGETS, ids=[budget.module for budget in BUDGETS])
+def test_import_time(budget):
+    try:
+        _, _, failures = check_budget(budget)
+    except DependencyMissing as e:
+        pytest.skip(str(e))
+    assert not failures
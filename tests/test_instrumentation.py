@@ -0,0 +1,48 @@
+import pytest
+
+from flip_cards import instrumentation
+from flip_cards.instrumentation import SESSION_STATE_SAMPLE_EVERY, Metrics
+
+
+class _Sized:
+    def nbytes(self) -> int:
+        return 1000
+
+
+@pytest.fixture
+def metrics(tmp_path, monkeypatch):
+    metrics = Metrics(str(tmp_path / "metrics.json"), interval=3600)
+    monkeypatch.setattr(instrumentation, "_metrics", metrics)
+    return metrics
+
+
+def _gauges(metrics):
+    return metrics.snapshot()["gauges"]
+
+
+def test_session_state_size_is_sampled(metrics, monkeypatch):
+    calls = []
+    monkeypatch.setattr(Metrics, "set_session_size", lambda self, *args: calls.append(args))
+    session_state = {"quiz": list(range(100))}
+    for _ in range(2 * SESSION_STATE_SAMPLE_EVERY + 1):
+        instrumentation.record_session_state_size(session_state)
+    assert len(calls) == 3
+    assert len({session for session, _ in calls}) == 1
+
+
+def test_session_state_size_percentiles_across_sessions(metrics):
+    for n in range(1, 11):
+        session_state = {"sized": _Sized(), "quiz": "x" * 1000 * n, "suggestions": "y" * 10**6}
+        instrumentation.record_session_state_size(session_state, shared_keys=["suggestions"])
+    gauges = _gauges(metrics)
+    assert gauges["session_state_sessions"] == 10
+    assert 6000 < gauges["session_state_bytes_p50"] < 6100
+    assert 10000 < gauges["session_state_bytes_p90"] < 10100
+    assert 11000 < gauges["session_state_bytes_max"] < 11100
+
+
+def test_session_state_size_of_ended_sessions_expires(metrics, monkeypatch):
+    instrumentation.record_session_state_size({"quiz": "x"})
+    assert _gauges(metrics)["session_state_sessions"] == 1
+    monkeypatch.setattr(instrumentation, "SESSION_SIZE_TTL", -1.0)
+    assert "session_state_sessions" not in _gauges(metrics)
@@ -0,0 +1,147 @@
+import random
+import sys
+
+import pytest
+
+from flip_cards.matching import (
+    AnswerMatcher,
+    TrigramIndex,
+    edit_distance,
+    normalize_answer,
+    within_one_edit,
+)
+
+
+def _levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            )
+        previous = current
+    return previous[-1]
+
+
+@pytest.mark.parametrize(
+    "answer, key",
+    [
+        ("Zwarte Specht", "zwarte specht"),
+        ("  grote   bonte\tspecht ", "grote bonte specht"),
+        ("Ekster", "ekster"),
+        ("Kievít", "kievit"),
+        ("Ðurð", "ðurð"),
+        ("STRAẞE", "strasse"),
+    ],
+)
+def test_normalize_answer(answer, key):
+    assert normalize_answer(answer) == key
+
+
+@pytest.mark.parametrize(
+    "a, b, distance",
+    [
+        ("merel", "merel", 0),
+        ("merel", "merels", 1),
+        ("merel", "mrel", 1),
+        ("merel", "mersl", 1),
+        ("merel", "emrel", 2),
+        ("vogel 12345", "vogel 12399", 2),
+        ("", "mus", 3),
+    ],
+)
+def test_edit_distance(a, b, distance):
+    assert edit_distance(a, b, 3) == distance
+    assert edit_distance(b, a, 3) == distance
+
+
+def test_edit_distance_stops_above_max_distance():
+    assert edit_distance("merel", "koolmees", 2) == 3
+    assert edit_distance("a" * 10, "b" * 10, 1) == 2
+
+
+def test_edit_distance_matches_levenshtein():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("ab ") for _ in range(rng.randint(0, 8)))
+        b = "".join(rng.choice("ab ") for _ in range(rng.randint(0, 8)))
+        max_distance = rng.randint(0, 3)
+        assert edit_distance(a, b, max_distance) == min(_levenshtein(a, b), max_distance + 1)
+
+
+def test_within_one_edit_matches_levenshtein():
+    rng = random.Random(0)
+    for _ in range(2000):
+        a = "".join(rng.choice("ab ") for _ in range(rng.randint(0, 6)))
+        b = "".join(rng.choice("ab ") for _ in range(rng.randint(0, 6)))
+        assert within_one_edit(a, b) == (_levenshtein(a, b) <= 1)
+
+
+def test_keys_within_finds_all_close_keys():
+    keys = [f"vogel {i}" for i in range(500)] + ["merel", "merels", "mees"]
+    index = TrigramIndex.build(keys)
+    for given in ("vogel 12", "vogel 12x", "mere", "vogl 400", "x", "vogel 12xy"):
+        for max_distance in (1, 2):
+            expected = sorted(
+                key for key in keys if edit_distance(given, key, max_distance) <= max_distance
+            )
+            assert sorted(index.keys_within(given, max_distance)) == expected
+
+
+def test_alias_parsing():
+    matcher = AnswerMatcher(
+        ["roodborst", "koolmees", "merel"],
+        ["Roodborstje; Robin", ["Kool mees", " "], None],
+    )
+    assert matcher.card_keys(0) == ("roodborst", "roodborstje", "robin")
+    assert matcher.card_keys(1) == ("koolmees", "kool mees")
+    assert matcher.card_keys(2) == ("merel",)
+    assert matcher.is_correct("Robin", 0)
+    assert matcher.is_correct("kool mees", 1)
+    assert "robin" in matcher.index
+
+
+def test_typos_within_tolerance():
+    matcher = AnswerMatcher(["roodborst", "koolmees"])
+    assert matcher.is_correct("Roodborst", 0)
+    assert not matcher.is_correct("roodbrst", 0, tolerance=0)
+    assert matcher.is_correct("roodbrst", 0, tolerance=1)
+    assert not matcher.is_correct("rodbrst", 0, tolerance=1)
+    assert matcher.is_correct("rodbrst", 0, tolerance=2)
+
+
+def test_short_answers_get_fewer_typos():
+    matcher = AnswerMatcher(["mus", "mees"])
+    assert not matcher.is_correct("mis", 0, tolerance=2)
+    assert matcher.is_correct("mees", 1, tolerance=2)
+
+
+def test_answer_of_another_card_is_wrong():
+    matcher = AnswerMatcher(["merel", "merels"])
+    assert not matcher.is_correct("merels", 0, tolerance=1)
+    assert matcher.is_correct("merels", 1, tolerance=1)
+
+
+def test_another_key_is_closer():
+    matcher = AnswerMatcher(["koolmees", "koolmeel", "pimpelmees"])
+    # Two edits from koolmees, but one from koolmeel, that was probably meant
+    assert not matcher.is_correct("kolmeel", 0, tolerance=2)
+    assert matcher.is_correct("kolmeel", 1, tolerance=2)
+    # Two edits from koolmees, and no other key is closer
+    assert matcher.is_correct("kolmes", 0, tolerance=2)
+
+
+def test_another_alias_is_closer():
+    matcher = AnswerMatcher(["koolmees", "pimpelmees"], [None, "koolmeel"])
+    assert not matcher.is_correct("kolmeel", 0, tolerance=2)
+    assert matcher.is_correct("kolmeel", 1, tolerance=2)
+
+
+def test_nbytes_counts_keys_and_index():
+    keys = [f"vogel {i}" for i in range(1000)]
+    matcher = AnswerMatcher(keys)
+    n_key_bytes = sum(sys.getsizeof(key) for key in keys)
+    n_index_bytes = sys.getsizeof(matcher.index.postings)
+    # The index shares the key strings, so they are counted once
+    assert n_key_bytes + n_index_bytes < matcher.nbytes() < 2 * n_key_bytes + 2 * n_index_bytes
@@ -0,0 +1,26 @@
+import pytest
+
+from flip_cards.progress_store import ProgressStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProgressStore(tmp_path / "progress.db", flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def test_steps_follow_the_last_snapshot(store):
+    assert store.load_progress("u", "vogels") is None
+    store.save_progress("u", "vogels", {"seed": 1})
+    store.save_step("u", "vogels", 3, False)
+    store.save_step("u", "vogels", 1, True)
+    store.save_step("u", "bomen", 2, True)
+    store.flush()
+    assert store.load_progress("u", "vogels") == ({"seed": 1}, [(3, False), (1, True)])
+
+    store.save_progress("u", "vogels", {"seed": 2})
+    store.save_step("u", "vogels", 0, True)
+    store.flush()
+    assert store.load_progress("u", "vogels") == ({"seed": 2}, [(0, True)])
+    assert store.load_progress("v", "vogels") is None
@@ -0,0 +1,121 @@
+import copy
+
+import pytest
+
+from flip_cards.scheduler import LeitnerPolicy, Scheduler
+
+
+def _ask_all(scheduler: Scheduler, answer=None):
+    asked = []
+    while scheduler:
+        asked.append(scheduler.current)
+        if answer is not None:
+            scheduler.reschedule(scheduler.current, answer(scheduler.current))
+        scheduler.advance()
+    return asked
+
+
+def _asked_next(scheduler: Scheduler, k: int):
+    # The questions a copy asks after the current one, when none of them is answered
+    scheduler = copy.deepcopy(scheduler)
+    scheduler.advance()
+    return [scheduler.advance() for _ in range(k)]
+
+
+def test_every_question_is_asked_once_without_answers():
+    scheduler = Scheduler(range(10), LeitnerPolicy(), seed=1)
+    assert sorted(_ask_all(scheduler)) == list(range(10))
+
+
+def test_same_seed_same_order():
+    first = _ask_all(Scheduler(range(10), LeitnerPolicy(), seed=1))
+    assert _ask_all(Scheduler(range(10), LeitnerPolicy(), seed=1)) == first
+
+
+def test_wrong_answer_is_asked_again_after_retry_delay():
+    scheduler = Scheduler(range(5), LeitnerPolicy(retry_delay=(2, 2)), seed=1)
+    first = scheduler.current
+    scheduler.reschedule(first, False)
+    scheduler.advance()
+    asked = [scheduler.advance() for _ in range(2)]
+    # Due at step 2, after the question that was already due then
+    assert first not in asked
+    assert scheduler.current == first
+
+
+def test_correct_answer_retires_question():
+    scheduler = Scheduler(range(5), LeitnerPolicy(retire_correct=True), seed=1)
+    asked_before = set()
+
+    def _answer(question_index: int) -> bool:
+        # Question 3 is only answered correctly the second time
+        correct = question_index != 3 or question_index in asked_before
+        asked_before.add(question_index)
+        return correct
+
+    asked = _ask_all(scheduler, answer=_answer)
+    assert asked.count(3) == 2
+    assert all(asked.count(i) == 1 for i in (0, 1, 2, 4))
+
+
+def test_reschedule_only_current():
+    scheduler = Scheduler(range(5), LeitnerPolicy(), seed=1)
+    other = next(i for i in range(5) if i != scheduler.current)
+    with pytest.raises(ValueError):
+        scheduler.reschedule(other, True)
+
+
+def test_length_repeats_questions():
+    scheduler = Scheduler(range(3), LeitnerPolicy(), length=10, seed=1)
+    asked = _ask_all(scheduler, answer=lambda i: True)
+    assert len(asked) == 10
+    assert set(asked) == {0, 1, 2}
+
+
+def test_upcoming_matches_asked_order():
+    scheduler = Scheduler(range(20), LeitnerPolicy(retry_delay=(1, 3)), seed=2)
+    for step in range(10):
+        scheduler.reschedule(scheduler.current, step % 3 == 0)
+        assert scheduler.upcoming(5) == _asked_next(scheduler, 5)
+        scheduler.advance()
+
+
+def test_upcoming_includes_pending_reschedule():
+    scheduler = Scheduler(range(10), LeitnerPolicy(retry_delay=(1, 1)), seed=1)
+    current = scheduler.current
+    scheduler.reschedule(current, False)
+    # Due again at step 1, after the question that is due then
+    assert scheduler.upcoming(2)[1] == current
+    assert scheduler.upcoming(3) == _asked_next(scheduler, 3)
+
+
+def test_upcoming_is_shorter_at_the_end():
+    scheduler = Scheduler(range(3), LeitnerPolicy(), seed=1)
+    assert len(scheduler.upcoming(10)) == 2
+    _ask_all(scheduler)
+    assert scheduler.upcoming(10) == []
+
+
+def test_remap_renumbers_and_drops_questions():
+    scheduler = Scheduler(range(6), LeitnerPolicy(), seed=3)
+    order = Scheduler(range(6), LeitnerPolicy(), seed=3)
+    expected = [i for i in _ask_all(order) if i != 4]
+    scheduler.remap({i: i + 10 for i in range(6) if i != 4})
+    assert _ask_all(scheduler) == [i + 10 for i in expected]
+
+
+def test_remap_drops_pending_answer_of_removed_current():
+    scheduler = Scheduler(range(3), LeitnerPolicy(), length=10, seed=1)
+    current = scheduler.current
+    scheduler.reschedule(current, False)
+    scheduler.remap({i: i for i in range(3) if i != current})
+    assert not scheduler.answered
+    assert scheduler.current != current
+
+
+def test_remap_to_nothing_finishes_repeating_scheduler():
+    scheduler = Scheduler(range(3), LeitnerPolicy(), length=10, seed=1)
+    scheduler.remap({})
+    assert len(scheduler) == 0
+    with pytest.raises(IndexError):
+        scheduler.current
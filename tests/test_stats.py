@@ -0,0 +1,26 @@
+from flip_cards.stats import CardStats
+
+
+def test_record_counts_attempts_and_unique_questions():
+    stats = CardStats([4, 7, 9])
+    stats.record(7, False)
+    stats.record(7, True)
+    stats.record(9, True)
+    assert (stats.n_seen, stats.n_attempts, stats.n_correct) == (2, 3, 2)
+    assert (stats.n_attempts_of(7), stats.n_correct_of(7)) == (2, 1)
+    assert stats.is_seen(9)
+    assert not stats.is_seen(4)
+
+
+def test_remap_keeps_counts_of_remaining_questions():
+    stats = CardStats([4, 7, 9])
+    stats.record(4, True)
+    stats.record(7, False)
+    stats.record(7, True)
+    stats.remap({7: 0, 9: 1})
+    assert stats.n_questions == 2
+    assert (stats.n_seen, stats.n_attempts, stats.n_correct) == (1, 2, 1)
+    assert (stats.n_attempts_of(0), stats.n_correct_of(0)) == (2, 1)
+    assert not stats.is_seen(1)
+    stats.record(1, True)
+    assert (stats.n_seen, stats.n_correct) == (2, 2)